@@ -0,0 +1,110 @@
+# backend/ai_models/batching.py
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Dynamic micro-batching settings (opt-in, see setup.md)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "0") == "1"
+INFERENCE_BATCH_MAX_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", "8"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "10"))
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item requests and runs them through `batch_fn` together.
+
+    Callers block in `__call__` (or wait on the Future from `submit`) while a background
+    thread gathers up to `max_batch_size` items, waiting at most `max_wait_ms` after the
+    first one arrives, then runs one batched forward pass and fans the results back out.
+    `batch_fn` takes a list of items and must return a list of results in the same order.
+    If a batch fails, its items are retried one at a time so one bad input only fails its own caller.
+
+    The thread is started on the first `submit` in each process: a batcher created before a
+    prefork worker forks (or in the API process, which never submits) has no thread to inherit.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = INFERENCE_BATCH_MAX_SIZE,
+                 max_wait_ms: float = INFERENCE_BATCH_WAIT_MS, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = os.getpid()
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid != os.getpid(): # Forked without the at-fork hook
+            self._reset()
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-thread", daemon=True)
+                    self._thread.start()
+
+    def submit(self, item) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        batch = [self._queue.get()] # Block until there is work
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self._run_batch(items)
+            except Exception as e:
+                if len(items) == 1:
+                    futures[0].set_exception(e)
+                    continue
+                logger.warning(f"{self.name} batch of {len(items)} failed, retrying items one at a time: {e}")
+                for item, future in zip(items, futures):
+                    try:
+                        future.set_result(self._run_batch([item])[0])
+                    except Exception as item_error:
+                        logger.error(f"{self.name} item failed: {item_error}", exc_info=True)
+                        future.set_exception(item_error)
+                continue
+
+            logger.debug(f"{self.name} ran a batch of {len(items)}")
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def _run_batch(self, items: list) -> list:
+        results = self.batch_fn(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name} returned {len(results)} results for {len(items)} inputs")
+        return results
@@ -1,28 +1,195 @@
 # backend/ai_models/core.py
+import difflib
 import logging
-from transformers import pipeline, AutoProcessor, MusicgenForConditionalGeneration
+import os
+
+from dotenv import load_dotenv
+
+from ai_models.batching import MicroBatcher, INFERENCE_BATCHING
+from ai_models.optimize import optimize_model, inference_context, active_precision, apply_inference_context
+from ai_models.registry import ModelRegistry
+from metrics import instrument_pipeline, stage_timer
+
+load_dotenv() # Load environment variables
 
 logger = logging.getLogger(__name__)
 
-# Global model for image captioning
-# print("Loading image captioning model...")
-logger.info("Loading image captioning model...")
-captioner = pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
-# print("Image captioning model loaded.")
-logger.info("Image captioning model loaded.")
-
-# Global model for Visual Question Answering
-# print("Loading VQA model...")
-logger.info("Loading VQA model...")
-vqa_pipeline = pipeline("visual-question-answering", model="dandelin/vilt-b32-finetuned-vqa")
-# print("VQA model loaded.")
-logger.info("VQA model loaded.")
-
-
-# Global models for Text-to-Speech
-# print("Loading TTS processor and model...")
-logger.info("Loading TTS processor and model...")
-tts_processor = AutoProcessor.from_pretrained("facebook/musicgen-small")
-tts_model = MusicgenForConditionalGeneration.from_pretrained("facebook/musicgen-small")
-# print("TTS models loaded.")
-logger.info("TTS models loaded.")
\ No newline at end of file
+# Hugging Face model ids (also used to key the result cache)
+CAPTION_MODEL_ID = "Salesforce/blip-image-captioning-base"
+VQA_MODEL_ID = "dandelin/vilt-b32-finetuned-vqa"
+TTS_MODEL_ID = "facebook/musicgen-small"
+
+# TTS generation budget. MusicGen emits about 50 audio tokens per second of audio, so short
+# phrases get a proportionally smaller budget instead of always generating the maximum.
+TTS_MAX_NEW_TOKENS = int(os.getenv("TTS_MAX_NEW_TOKENS", "256"))
+TTS_MIN_NEW_TOKENS = int(os.getenv("TTS_MIN_NEW_TOKENS", "32"))
+TTS_TOKENS_PER_CHAR = float(os.getenv("TTS_TOKENS_PER_CHAR", "3.5"))
+
+# Minimum agreement with the fp32 model for a quantized/bf16 model to be used (see optimize_model)
+CAPTION_MIN_AGREEMENT = 0.6   # mean word-sequence similarity of the captions
+VQA_MIN_AGREEMENT = 0.75      # fraction of identical answers
+TTS_MIN_SIMILARITY = 0.95     # cosine similarity of the first-step audio token logits
+
+# Fixed inputs used to check optimized models against fp32 and to warm them up
+CALIBRATION_QUESTIONS = ["What color is this?", "Is it dark?", "How many circles are there?"]
+CALIBRATION_TEXT = "Hello, this is a short test sentence."
+
+def calibration_images() -> list:
+    from PIL import Image, ImageDraw
+
+    images = [Image.new("RGB", (384, 384), (200, 30, 30))]
+    split = Image.new("RGB", (384, 384), (255, 255, 255))
+    ImageDraw.Draw(split).rectangle((0, 0, 191, 383), fill=(0, 0, 0))
+    images.append(split)
+    circles = Image.new("RGB", (384, 384), (240, 240, 200))
+    for x in (40, 220):
+        ImageDraw.Draw(circles).ellipse((x, 130, x + 120, 250), fill=(30, 60, 200))
+    images.append(circles)
+    return images
+
+def _text_agreement(reference: list, outputs: list) -> float:
+    return sum(difflib.SequenceMatcher(None, a.split(), b.split()).ratio() for a, b in zip(reference, outputs)) / len(reference)
+
+def _answer_agreement(reference: list, outputs: list) -> float:
+    return sum(a == b for a, b in zip(reference, outputs)) / len(reference)
+
+def _logit_similarity(reference, outputs) -> float:
+    import torch
+    return max(0.0, torch.nn.functional.cosine_similarity(reference.flatten(), outputs.flatten(), dim=0).item())
+
+# Models are loaded lazily on first use, so importing this module (e.g. from the API process) is cheap.
+# transformers itself is imported inside the loaders for the same reason.
+# Loaders apply the MODEL_PROFILE (quantization/bf16, warm-up; see optimize.py), and pipelines are
+# instrumented so their preprocess/forward/postprocess steps show up in the stage metrics.
+registry = ModelRegistry()
+
+def _load_captioner():
+    from transformers import pipeline
+    captioner = pipeline("image-to-text", model=CAPTION_MODEL_ID)
+    images = calibration_images()
+
+    def evaluate(model, precision):
+        captioner.model = model
+        with inference_context(precision):
+            return [output[0]['generated_text'] for output in captioner(images)]
+
+    captioner.model, precision = optimize_model("caption", captioner.model, evaluate, _text_agreement, CAPTION_MIN_AGREEMENT)
+    return instrument_pipeline(apply_inference_context(captioner, precision), "caption")
+
+def _load_vqa_pipeline():
+    from transformers import pipeline
+    vqa = pipeline("visual-question-answering", model=VQA_MODEL_ID)
+    images = calibration_images()
+
+    def evaluate(model, precision):
+        vqa.model = model
+        with inference_context(precision):
+            return [vqa(image=image, question=question)[0]['answer'] for image in images for question in CALIBRATION_QUESTIONS]
+
+    vqa.model, precision = optimize_model("vqa", vqa.model, evaluate, _answer_agreement, VQA_MIN_AGREEMENT)
+    return instrument_pipeline(apply_inference_context(vqa, precision), "vqa")
+
+def _load_tts():
+    import torch
+    from transformers import AutoProcessor, MusicgenForConditionalGeneration
+    tts_processor = AutoProcessor.from_pretrained(TTS_MODEL_ID)
+    tts_model = MusicgenForConditionalGeneration.from_pretrained(TTS_MODEL_ID)
+    inputs = tts_processor(text=[CALIBRATION_TEXT], padding=True, return_tensors="pt")
+
+    def evaluate(model, precision):
+        # Sampling makes generated audio differ run to run, so accuracy is judged on the logits of
+        # the first decoding step; the short generate() call warms up the decoding loop itself.
+        decoder_input_ids = torch.full((model.decoder.config.num_codebooks, 1), model.generation_config.decoder_start_token_id)
+        with inference_context(precision):
+            logits = model(**inputs, decoder_input_ids=decoder_input_ids).logits.float()
+            model.generate(**inputs, do_sample=False, max_new_tokens=TTS_MIN_NEW_TOKENS)
+        return logits
+
+    tts_model, _ = optimize_model("tts", tts_model, evaluate, _logit_similarity, TTS_MIN_SIMILARITY)
+    return tts_processor, tts_model
+
+registry.register("caption", _load_captioner)
+registry.register("vqa", _load_vqa_pipeline)
+registry.register("tts", _load_tts)
+
+def get_captioner():
+    return registry.get("caption")
+
+def get_vqa_pipeline():
+    return registry.get("vqa")
+
+def get_tts():
+    """
+    Returns the (processor, model) pair used for text-to-speech.
+    """
+    return registry.get("tts")
+
+
+# Batched inference helpers: each list of inputs runs as one padded forward pass.
+def caption_batch(images: list) -> list:
+    # BLIP resizes every image to 384x384, so the pipeline can stack them as they are
+    outputs = get_captioner()(images, batch_size=len(images))
+    return [output[0]['generated_text'] for output in outputs]
+
+def answer_batch(pairs: list) -> list:
+    """
+    Answers (image, question) pairs in one forward pass. ViLT keeps each image's aspect ratio,
+    so the pipeline's collate step can't stack mixed shapes; the image processor pads the
+    batch to its largest image instead, and `pixel_mask` marks the padding.
+    """
+    vqa = get_vqa_pipeline()
+    with stage_timer("vqa", "preprocess"):
+        image_inputs = vqa.image_processor(images=[image.convert("RGB") for image, _ in pairs], do_pad=True, return_tensors="pt")
+        text_inputs = vqa.tokenizer([question for _, question in pairs], padding=True, truncation=True, return_tensors="pt")
+    return _answer_logits(vqa, {**text_inputs, "pixel_values": image_inputs["pixel_values"], "pixel_mask": image_inputs["pixel_mask"]})
+
+def _answer_logits(vqa, inputs: dict) -> list:
+    with stage_timer("vqa", "forward"), inference_context(active_precision("vqa")):
+        logits = vqa.model(**inputs).logits
+    with stage_timer("vqa", "postprocess"):
+        return [vqa.model.config.id2label[index] for index in logits.argmax(-1).tolist()]
+
+
+# With INFERENCE_BATCHING=1 concurrent calls (e.g. from a threads-pool Celery worker) are micro-batched.
+# The batcher threads only start on first use, in the process that runs the tasks.
+caption_batcher = MicroBatcher(caption_batch, name="caption-batcher") if INFERENCE_BATCHING else None
+vqa_batcher = MicroBatcher(answer_batch, name="vqa-batcher") if INFERENCE_BATCHING else None
+
+def caption_image(image) -> str:
+    if caption_batcher is not None:
+        return caption_batcher(image)
+    return get_captioner()(image)[0]['generated_text']
+
+def answer_question(image, question: str) -> str:
+    if vqa_batcher is not None:
+        return vqa_batcher((image, question))
+    return get_vqa_pipeline()(image=image, question=question)[0]['answer']
+
+def synthesize_speech(text: str):
+    """
+    Generates speech for `text`. Returns (float audio samples, sampling rate).
+    """
+    tts_processor, tts_model = get_tts()
+    max_new_tokens = min(TTS_MAX_NEW_TOKENS, max(TTS_MIN_NEW_TOKENS, int(len(text) * TTS_TOKENS_PER_CHAR)))
+    with stage_timer("tts", "preprocess"):
+        inputs = tts_processor(text=text, sampling_rate=tts_model.config.sampling_rate, return_tensors="pt")
+    with stage_timer("tts", "forward"), inference_context(active_precision("tts")):
+        audio_values = tts_model.generate(**inputs, do_sample=True, guidance_scale=3.0, max_new_tokens=max_new_tokens)
+    return audio_values[0, 0].float().cpu().numpy(), tts_model.config.sampling_rate
+
+def answer_questions(image, questions: list) -> list:
+    """
+    Answers several questions about one image in a single forward pass. The image is
+    preprocessed once and its pixel tensor shared by every question in the batch.
+    """
+    vqa = get_vqa_pipeline()
+    with stage_timer("vqa", "preprocess"):
+        image_inputs = vqa.image_processor(images=image, return_tensors="pt")
+        text_inputs = vqa.tokenizer(questions, padding=True, truncation=True, return_tensors="pt")
+        count = len(questions)
+        inputs = {
+            **text_inputs,
+            "pixel_values": image_inputs["pixel_values"].expand(count, -1, -1, -1),
+            "pixel_mask": image_inputs["pixel_mask"].expand(count, -1, -1),
+        }
+    return _answer_logits(vqa, inputs)
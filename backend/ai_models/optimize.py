@@ -0,0 +1,168 @@
+# backend/ai_models/optimize.py
+import contextlib
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Model loading profile (see setup.md for details)
+#   default        fp32, torch's default threading, no warm-up (the original behavior)
+#   cpu-optimized  int8 dynamic quantization of Linear layers (or bf16 on CPUs with native
+#                  bf16 support), threads matched to the worker's concurrency, warm-up at load
+MODEL_PROFILE = os.getenv("MODEL_PROFILE", "default")
+PROFILES = ("default", "cpu-optimized")
+if MODEL_PROFILE not in PROFILES:
+    raise ValueError(f"Unknown MODEL_PROFILE '{MODEL_PROFILE}'. Choose from: {', '.join(PROFILES)}")
+CPU_OPTIMIZED = MODEL_PROFILE == "cpu-optimized"
+
+# "auto" lets the profile decide; MODEL_PRECISION_<NAME> (e.g. MODEL_PRECISION_TTS) overrides one model
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "auto")
+PRECISIONS = ("fp32", "int8", "bf16")
+TORCH_NUM_THREADS = os.getenv("TORCH_NUM_THREADS", "auto" if CPU_OPTIMIZED else "")  # "auto": cores / concurrency
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1" if CPU_OPTIMIZED else "0"))  # 0 keeps torch's default
+CPU_PIN_CORES = os.getenv("CPU_PIN_CORES", "1" if CPU_OPTIMIZED else "0") == "1"
+MODEL_WARMUP_ITERATIONS = int(os.getenv("MODEL_WARMUP_ITERATIONS", "2" if CPU_OPTIMIZED else "0"))
+ACCURACY_CHECK = os.getenv("ACCURACY_CHECK", "1") == "1"
+
+# Precision each loaded model ended up with, and its accuracy score against fp32 (for logs and benchmarks)
+model_reports = {}
+
+
+def cpu_supports_bf16() -> bool:
+    """
+    True if the CPU computes bf16 natively (AVX512-BF16 or AMX). Elsewhere bf16 is emulated
+    and slower than fp32, so the profile falls back to int8.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def model_precision(name: str) -> str:
+    precision = os.getenv(f"MODEL_PRECISION_{name.upper()}", MODEL_PRECISION)
+    if precision == "auto":
+        if not CPU_OPTIMIZED:
+            return "fp32"
+        return "bf16" if cpu_supports_bf16() else "int8"
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}' for {name}. Choose from: auto, {', '.join(PRECISIONS)}")
+    return precision
+
+
+def inference_context(precision: str = "fp32"):
+    """
+    Context for a forward pass: no autograd bookkeeping, plus bf16 autocast for bf16 models.
+    A no-op if torch was never imported, since the models can't be torch modules then.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return contextlib.nullcontext()
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if precision == "bf16":
+        stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+    return stack
+
+
+def active_precision(name: str) -> str:
+    """
+    Precision the loaded model `name` runs at.
+    """
+    return model_reports.get(name, {}).get("precision", "fp32")
+
+
+def apply_inference_context(pipe, precision: str):
+    """
+    Runs every forward pass of a transformers pipeline inside `inference_context(precision)`.
+    """
+    forward = pipe._forward
+
+    def _forward(*args, **kwargs):
+        with inference_context(precision):
+            return forward(*args, **kwargs)
+
+    pipe._forward = _forward
+    return pipe
+
+
+def quantize_linear(model):
+    """
+    Returns a copy of `model` with every nn.Linear replaced by a dynamically quantized int8 Linear.
+    Weights are stored as int8 and activations are quantized on the fly, so no calibration is needed.
+    """
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def optimize_model(name: str, model, evaluate, compare, min_score: float):
+    """
+    Applies the profile's precision to `model` and warms it up. Returns (model, precision).
+
+    `evaluate(model, precision)` runs the model on a few fixed inputs and returns its outputs;
+    `compare(reference, outputs)` scores outputs against the fp32 reference from 0 to 1. If the
+    optimized model scores below `min_score`, the fp32 model is kept. The evaluation passes
+    double as the first warm-up passes.
+    """
+    precision = model_precision(name)
+    report = {"precision": precision, "score": None}
+    if precision != "fp32":
+        reference = evaluate(model, "fp32") if ACCURACY_CHECK else None
+        candidate = quantize_linear(model) if precision == "int8" else model
+        if reference is not None:
+            report["score"] = compare(reference, evaluate(candidate, precision))
+            logger.info(f"{name} {precision} accuracy vs fp32: {report['score']:.3f} (minimum {min_score})")
+            if report["score"] < min_score:
+                logger.warning(f"{name} {precision} is below the accuracy threshold; keeping fp32")
+                candidate, precision = model, "fp32"
+                report["precision"] = precision
+        model = candidate
+
+    for _ in range(MODEL_WARMUP_ITERATIONS):
+        evaluate(model, precision)
+    model_reports[name] = report
+    return model, precision
+
+
+def configure_threads(concurrency: int = 1, worker_index: int | None = None):
+    """
+    Sizes torch's thread pools for a worker process that runs `concurrency` tasks at once
+    (prefork children run one each), so concurrent forward passes don't oversubscribe the cores.
+
+    With CPU_PIN_CORES, prefork child `worker_index` is also pinned to its own slice of cores.
+    """
+    if not TORCH_NUM_THREADS and not TORCH_INTEROP_THREADS:
+        return
+    import torch
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if TORCH_NUM_THREADS == "auto":
+        threads = max(1, len(cores) // max(1, concurrency))
+    elif TORCH_NUM_THREADS:
+        threads = int(TORCH_NUM_THREADS)
+    else:
+        threads = None
+
+    pinned = CPU_PIN_CORES and worker_index is not None and threads and hasattr(os, "sched_setaffinity")
+    if pinned:
+        start = (worker_index * threads) % len(cores)
+        os.sched_setaffinity(0, cores[start:start + threads] or cores)
+
+    if threads:
+        torch.set_num_threads(threads)
+    if TORCH_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError as e: # Only allowed before the first inter-op parallel call
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"torch threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op"
+                + (f", pinned to cores {sorted(os.sched_getaffinity(0))}" if pinned else ""))
@@ -0,0 +1,57 @@
+# backend/ai_models/registry.py
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry that builds each model the first time it is requested.
+
+    Loaders are registered by name and only run on first `get` (or an explicit `warm`),
+    so a process only pays the import time and memory of the models it actually serves.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model '{name}'. Registered models: {', '.join(self._loaders)}")
+
+        with self._locks[name]: # Concurrent first callers wait for a single load
+            model = self._models.get(name)
+            if model is None:
+                logger.info(f"Loading {name} model...")
+                start = time.perf_counter()
+                model = self._loaders[name]()
+                self._models[name] = model
+                logger.info(f"{name} model loaded in {time.perf_counter() - start:.1f}s.")
+        return model
+
+    def warm(self, names=None):
+        """
+        Loads the given models (all registered models by default) ahead of the first request.
+        """
+        for name in names if names is not None else list(self._loaders):
+            self.get(name)
+
+    def names(self) -> list:
+        return list(self._loaders)
+
+    def loaded(self) -> list:
+        return list(self._models)
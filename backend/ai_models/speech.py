@@ -0,0 +1,93 @@
+# backend/ai_models/speech.py
+import io
+import re
+import struct
+
+import numpy as np
+import scipy.io.wavfile as wavfile
+
+from ai_models.core import TTS_MODEL_ID
+from cache import make_cache_key, normalize_text
+
+# Output formats for generated speech. wav is raw 16-bit PCM; ogg (Vorbis) and flac are compressed.
+AUDIO_MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+    "flac": "audio/flac",
+}
+# Formats whose chunks can be played back-to-back as one stream (/speech_stream)
+STREAMABLE_FORMATS = {"wav", "ogg"}
+
+# Sentence ends, then weaker phrase boundaries used to break up long sentences
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+")
+_PHRASE_BOUNDARY = re.compile(r"(?<=[,])\s+")
+
+
+def speech_cache_key(text: str, audio_format: str) -> str:
+    """
+    Result cache key for the complete audio of `text` in `audio_format`.
+    """
+    return make_cache_key(TTS_MODEL_ID, text=f"{audio_format}:{normalize_text(text)}")
+
+
+def split_text(text: str, max_chars: int = 200, min_chars: int = 20) -> list:
+    """
+    Splits text into speakable chunks at sentence (then phrase) boundaries.
+
+    Chunks longer than `max_chars` are split at commas, then at word boundaries; fragments
+    shorter than `min_chars` are merged into their neighbour so each chunk is worth a forward pass.
+    """
+    pieces = []
+    for sentence in _SENTENCE_BOUNDARY.split(" ".join(text.split())):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for phrase in _PHRASE_BOUNDARY.split(sentence):
+            while len(phrase) > max_chars:
+                cut = phrase.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(phrase[:cut])
+                phrase = phrase[cut:].lstrip()
+            pieces.append(phrase)
+
+    chunks = []
+    for piece in filter(None, pieces):
+        if chunks and (len(chunks[-1]) < min_chars or len(piece) < min_chars) and len(chunks[-1]) + len(piece) < max_chars:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def to_pcm16(audio: np.ndarray) -> np.ndarray:
+    """
+    Converts float audio in [-1, 1] to 16-bit PCM.
+    """
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def encode_audio(pcm: np.ndarray, sampling_rate: int, audio_format: str = "wav") -> bytes:
+    """
+    Encodes 16-bit PCM samples as a complete audio file in the requested format.
+    """
+    buffer = io.BytesIO()
+    if audio_format == "wav":
+        wavfile.write(buffer, sampling_rate, pcm)
+    elif audio_format in ("ogg", "flac"):
+        import soundfile # Needs libsndfile; only imported when a compressed format is requested
+        soundfile.write(buffer, pcm, sampling_rate, format=audio_format.upper(),
+                        subtype="VORBIS" if audio_format == "ogg" else "PCM_16")
+    else:
+        raise ValueError(f"Unsupported audio format '{audio_format}'. Choose from: {', '.join(AUDIO_MEDIA_TYPES)}")
+    return buffer.getvalue()
+
+
+def streaming_wav_header(sampling_rate: int, channels: int = 1) -> bytes:
+    """
+    WAV header for a 16-bit PCM stream of unknown length; players read until the connection closes.
+    """
+    unknown_size = 0xFFFFFFFF
+    byte_rate = sampling_rate * channels * 2
+    return (b"RIFF" + struct.pack("<I", unknown_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sampling_rate, byte_rate, channels * 2, 16)
+            + b"data" + struct.pack("<I", unknown_size))
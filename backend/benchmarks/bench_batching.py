@@ -0,0 +1,89 @@
+# backend/benchmarks/bench_batching.py
+"""
+Compares the one-at-a-time inference path against MicroBatcher at several batch sizes.
+
+Runs on CPU with a stub model (a stack of dense layers in numpy) so it needs no model
+downloads: each forward pass pays a fixed per-call overhead plus the layer matmuls,
+which is the cost profile batching is meant to amortize.
+
+    python benchmarks/bench_batching.py --requests 512 --concurrency 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from ai_models.batching import MicroBatcher
+
+
+class StubModel:
+    def __init__(self, dim: int = 768, layers: int = 12, overhead_ms: float = 2.0):
+        rng = np.random.default_rng(0)
+        self.weights = [rng.standard_normal((dim, dim), dtype=np.float32) / np.sqrt(dim) for _ in range(layers)]
+        self.dim = dim
+        self.overhead = overhead_ms / 1000.0
+
+    def __call__(self, inputs: list) -> list:
+        # Per-call overhead (preprocessing, dispatch) that does not depend on batch size
+        end = time.perf_counter() + self.overhead
+        while time.perf_counter() < end:
+            pass
+        hidden = np.stack(inputs)
+        for weight in self.weights:
+            hidden = np.tanh(hidden @ weight)
+        return list(hidden.sum(axis=1))
+
+
+def run(label: str, infer, requests: int, concurrency: int, dim: int):
+    latencies = []
+    lock = threading.Lock()
+    sample = np.ones(dim, dtype=np.float32)
+    per_thread = requests // concurrency
+
+    def client():
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            infer(sample)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{label:<24} {len(latencies) / wall:>10.1f} {np.percentile(latencies_ms, 50):>10.2f} {np.percentile(latencies_ms, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--layers", type=int, default=12)
+    parser.add_argument("--overhead-ms", type=float, default=2.0)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[2, 4, 8, 16])
+    args = parser.parse_args()
+
+    model = StubModel(args.dim, args.layers, args.overhead_ms)
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients, wait window {args.wait_ms} ms")
+    print(f"{'mode':<24} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    run("one-at-a-time", lambda x: model([x])[0], args.requests, args.concurrency, args.dim)
+    for batch_size in args.batch_sizes:
+        batcher = MicroBatcher(model, max_batch_size=batch_size, max_wait_ms=args.wait_ms, name=f"batch-{batch_size}")
+        run(f"micro-batch max={batch_size}", batcher, args.requests, args.concurrency, args.dim)
+
+
+if __name__ == "__main__":
+    main()
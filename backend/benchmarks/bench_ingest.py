@@ -0,0 +1,72 @@
+# backend/benchmarks/bench_ingest.py
+"""
+Compares queueing uploaded images as-is with the ingest pipeline (reduced-resolution
+decode + downscale to model size + JPEG re-encode) from ingest.py.
+
+For each mode and image size, reported per request:
+  queued bytes   size of the blob the worker has to read
+  api ms         time spent in the API preparing the blob (0 for raw)
+  worker ms      time for the worker to decode the blob and resize it to the model's
+                 384x384 input, as the BLIP/ViLT image processors do
+
+    python benchmarks/bench_ingest.py --iterations 10
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from ingest import normalize_image
+
+SIZES = [(4000, 3000), (1920, 1080), (640, 480)]
+
+
+def make_image(width: int, height: int) -> bytes:
+    # Smooth gradient plus noise so the JPEG compresses like a photo rather than pure noise
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def worker_decode(data: bytes):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    return image.resize((384, 384), Image.Resampling.BICUBIC)
+
+
+def measure(prepare, data: bytes, iterations: int):
+    api_ms, worker_ms = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        blob = prepare(data)
+        api_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        worker_decode(blob)
+        worker_ms.append((time.perf_counter() - start) * 1000)
+    return len(blob), np.median(api_ms), np.median(worker_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'image':<12} {'mode':<10} {'queued bytes':>14} {'api ms':>8} {'worker ms':>10}")
+    for width, height in SIZES:
+        data = make_image(width, height)
+        for label, prepare in (("raw", lambda d: d), ("ingest", normalize_image)):
+            size, api_ms, worker_ms = measure(prepare, data, args.iterations)
+            print(f"{f'{width}x{height}':<12} {label:<10} {size:>14,} {api_ms:>8.1f} {worker_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# backend/benchmarks/bench_load.py
+"""
+Load test for the real API endpoints, runnable entirely offline.
+
+By default everything runs in this process: the FastAPI app (called through an ASGI
+transport), a Celery worker thread on an in-memory broker, fakeredis in place of Redis
+(result backend, cache, blob store and task events) and tiny stub models with a fixed
+forward time. Only the models are fake, so the numbers track the overhead of the serving
+path (upload, ingest, queueing, events, caching, encoding) and show regressions in it.
+
+Each endpoint is driven on its own with --concurrency clients. A request counts as complete
+when its task reaches a terminal state (via the /task_status/{id}/wait long-poll). Reported
+per endpoint: throughput, submit latency and end-to-end latency percentiles, plus the mean of
+every stage from the stage histograms.
+
+    python benchmarks/bench_load.py --requests 200 --concurrency 16
+    python benchmarks/bench_load.py --base-url http://localhost:8000   # a running deployment
+
+Use --json to save the results for comparing runs.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import numpy as np
+from PIL import Image
+
+ENDPOINTS = ["caption_image", "answer_question", "generate_speech"]
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+# Stub models: same call signatures and output shapes as the transformers objects in ai_models/core.py
+class StubPipeline:
+    """
+    Minimal stand-in for a transformers pipeline. Has the preprocess/_forward/postprocess steps
+    so it can be instrumented like the real pipelines.
+    """
+
+    def __init__(self, forward_ms: float, output):
+        self.forward_ms = forward_ms
+        self.output = output
+
+    def preprocess(self, inputs):
+        image = inputs["image"] if isinstance(inputs, dict) else inputs
+        return np.asarray(image.convert("RGB").resize((384, 384)), dtype=np.float32) / 255.0
+
+    def _forward(self, pixel_values):
+        time.sleep(self.forward_ms / 1000)
+        return float(pixel_values.mean())
+
+    def postprocess(self, value):
+        return [{**self.output, "score": value}]
+
+    def __call__(self, inputs=None, batch_size=None, **kwargs):
+        if kwargs: # Keyword form: pipeline(image=..., question=...)
+            inputs = kwargs
+        if isinstance(inputs, list):
+            # A batch shares one forward pass
+            pixel_values = np.stack([self.preprocess(item) for item in inputs])
+            value = self._forward(pixel_values)
+            return [self.postprocess(value) for _ in inputs]
+        return self.postprocess(self._forward(self.preprocess(inputs)))
+
+
+class StubAudio(np.ndarray):
+    """
+    numpy array with the torch tensor methods synthesize_speech uses.
+    """
+
+    def float(self):
+        return self
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class StubTTSModel:
+    class config:
+        sampling_rate = 32000
+
+    def __init__(self, forward_ms: float):
+        self.forward_ms = forward_ms
+
+    def generate(self, max_new_tokens: int = 256, **kwargs):
+        time.sleep(self.forward_ms / 1000)
+        samples = max_new_tokens * 640 # MusicGen: 50 tokens per second of 32 kHz audio
+        tone = 0.1 * np.sin(np.linspace(0, 440 * 2 * np.pi * samples / 32000, samples, dtype=np.float32))
+        return tone.reshape(1, 1, -1).view(StubAudio)
+
+
+def stub_tts_processor(text=None, sampling_rate=None, return_tensors=None):
+    return {}
+
+
+def setup_offline_stack(args):
+    """
+    Points every Redis client at one in-process fakeredis server, starts an in-process Celery
+    worker on the memory broker and registers the stub models. Returns (ASGI app, worker context).
+    """
+    os.environ.update({
+        "CELERY_BROKER_URL": "memory://",
+        "CELERY_RESULT_BACKEND": "redis://fakeredis/0",
+        "PRELOAD_MODELS": "none",
+        "WORKER_METRICS_PORT": "0",
+    })
+
+    import fakeredis
+    import redis
+    import redis.asyncio as aioredis
+
+    server = fakeredis.FakeServer()
+    redis.Redis.from_url = classmethod(lambda cls, *a, **kw: fakeredis.FakeRedis(server=server))
+    aioredis.Redis.from_url = classmethod(lambda cls, *a, **kw: fakeredis.aioredis.FakeRedis(server=server))
+    from celery.backends.redis import RedisBackend
+    RedisBackend._create_client = lambda self, **params: fakeredis.FakeRedis(server=server)
+
+    from ai_models.core import registry
+    from celery.contrib.testing.worker import start_worker
+    from celery_worker import celery_app
+    from main import app
+    from metrics import instrument_pipeline
+
+    registry.register("caption", lambda: instrument_pipeline(StubPipeline(args.caption_ms, {"generated_text": "a stub caption"}), "caption"))
+    registry.register("vqa", lambda: instrument_pipeline(StubPipeline(args.vqa_ms, {"answer": "yes"}), "vqa"))
+    registry.register("tts", lambda: (stub_tts_processor, StubTTSModel(args.tts_ms)))
+
+    # The memory transport polls its queues; the default 1s interval would dominate queue wait
+    celery_app.conf.broker_transport_options = {"polling_interval": 0.005}
+    worker = start_worker(celery_app, pool="threads", concurrency=args.worker_concurrency,
+                          queues=["caption", "vqa", "tts"], perform_ping_check=False)
+    return app, worker
+
+
+def make_image(seed: int, width: int, height: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).resize((width, height), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def build_request(endpoint: str, index: int, images: list) -> dict:
+    image = images[index % len(images)]
+    if endpoint == "caption_image":
+        return {"files": {"image": ("image.jpg", image, "image/jpeg")}}
+    if endpoint == "answer_question":
+        return {"files": {"file": ("image.jpg", image, "image/jpeg")}, "data": {"question": "Is there a dog?"}}
+    return {"data": {"text": f"This is sample sentence number {index % len(images)} for the load test."}}
+
+
+async def wait_for_task(client: httpx.AsyncClient, response: dict) -> str:
+    if response.get("status") == "SUCCESS": # Served from the cache
+        return "SUCCESS"
+    while True:
+        status = (await client.get(f"/task_status/{response['task_id']}/wait", params={"timeout": 30})).json()
+        if status["status"] in TERMINAL_STATES:
+            return status["status"]
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, images: list, requests: int, concurrency: int) -> dict:
+    submit_ms, total_ms = [], []
+    errors = 0
+    next_index = 0
+
+    async def client_loop():
+        nonlocal next_index, errors
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/{endpoint}", **build_request(endpoint, index, images))
+                response.raise_for_status()
+                submitted = time.perf_counter()
+                status = await wait_for_task(client, response.json())
+            except httpx.HTTPError as e:
+                logging.warning(f"{endpoint} request failed: {e}")
+                errors += 1
+                continue
+            if status != "SUCCESS":
+                errors += 1
+                continue
+            submit_ms.append((submitted - start) * 1000)
+            total_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    def percentiles(values):
+        return {f"p{p}": float(np.percentile(values, p)) if values else None for p in (50, 95, 99)}
+
+    return {
+        "endpoint": endpoint,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": len(total_ms) / elapsed,
+        "submit_ms": percentiles(submit_ms),
+        "end_to_end_ms": percentiles(total_ms),
+    }
+
+
+def stage_means() -> dict:
+    """
+    Mean duration (ms) of every (operation, stage) pair recorded in this process.
+    """
+    from metrics import STAGE_SECONDS
+
+    sums, counts = {}, {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            key = f"{sample.labels['operation']}.{sample.labels['stage']}"
+            if sample.name.endswith("_sum"):
+                sums[key] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[key] = sample.value
+    return {key: sums[key] / counts[key] * 1000 for key in sorted(sums) if counts.get(key)}
+
+
+def print_results(results: list, stages: dict):
+    print(f"{'endpoint':<18} {'ok':>5} {'err':>4} {'req/s':>8} {'submit p50':>11} {'p95':>8} {'p99':>8} {'e2e p50':>9} {'p95':>8} {'p99':>8}")
+    for result in results:
+        submit, total = result["submit_ms"], result["end_to_end_ms"]
+        fmt = lambda value: f"{value:.1f}" if value is not None else "-"
+        print(f"{result['endpoint']:<18} {result['requests'] - result['errors']:>5} {result['errors']:>4} "
+              f"{result['throughput_rps']:>8.1f} {fmt(submit['p50']):>11} {fmt(submit['p95']):>8} {fmt(submit['p99']):>8} "
+              f"{fmt(total['p50']):>9} {fmt(total['p95']):>8} {fmt(total['p99']):>8}")
+    if stages:
+        print("\nmean stage time (ms)")
+        for key, value in stages.items():
+            print(f"  {key:<28} {value:>8.2f}")
+
+
+async def run(args, app=None):
+    images = [make_image(seed, args.width, args.height) for seed in range(args.distinct or args.requests)]
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url=args.base_url or "http://loadtest", timeout=60, limits=limits) as client:
+        for endpoint in args.endpoints:
+            results.append(await run_endpoint(client, endpoint, images, args.requests, args.concurrency))
+        if app is not None:
+            from events import get_task_event_hub
+            await get_task_event_hub().stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", type=lambda value: value.split(","), default=ENDPOINTS,
+                        help=f"Comma-separated endpoints (default: {','.join(ENDPOINTS)})")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="Number of distinct inputs to cycle through (default: all unique, so no cache hits)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--base-url", default=None, help="Drive a running deployment instead of the offline stack")
+    parser.add_argument("--worker-concurrency", type=int, default=4, help="Offline worker threads")
+    parser.add_argument("--caption-ms", type=float, default=20.0, help="Stub caption forward time")
+    parser.add_argument("--vqa-ms", type=float, default=10.0, help="Stub VQA forward time")
+    parser.add_argument("--tts-ms", type=float, default=50.0, help="Stub TTS forward time")
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    args = parser.parse_args()
+
+    if args.base_url:
+        results, stages = asyncio.run(run(args)), {}
+    else:
+        app, worker = setup_offline_stack(args)
+        logging.getLogger().setLevel(logging.WARNING) # Per-request INFO logs would dominate the run
+        with worker:
+            results = asyncio.run(run(args, app))
+        stages = stage_means()
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}, {args.width}x{args.height} images")
+    print_results(results, stages)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results, "stages_ms": stages}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
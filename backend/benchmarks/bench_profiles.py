@@ -0,0 +1,99 @@
+# backend/benchmarks/bench_profiles.py
+"""
+Measures per-model latency and memory for each MODEL_PROFILE (see ai_models/optimize.py).
+
+Every (profile, model) pair runs in a fresh interpreter, so peak RSS belongs to that model
+alone. Torch threads are sized as for a worker process with --concurrency concurrent tasks.
+Reported per pair:
+  precision     what the model ended up running at (fp32 if the accuracy check failed)
+  accuracy      agreement with fp32 on the calibration inputs (1.0 = identical; - for fp32)
+  load s        load + optimize + warm-up time
+  p50 / p95 ms  latency of one request (caption, answer or speech for a short sentence)
+  RSS MB        steady-state resident memory after the requests (what a worker keeps)
+  peak RSS MB   peak resident memory of the process, including the fp32 reference and the
+                fp32 model that quantization copies from during loading
+
+    python benchmarks/bench_profiles.py
+    python benchmarks/bench_profiles.py --models caption vqa --iterations 20 --concurrency 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = ["default", "cpu-optimized"]
+
+MODEL_CALLS = {
+    "caption": "core.caption_image(images[i % len(images)])",
+    "vqa": "core.answer_question(images[i % len(images)], core.CALIBRATION_QUESTIONS[i % len(core.CALIBRATION_QUESTIONS)])",
+    "tts": "core.synthesize_speech(core.CALIBRATION_TEXT)",
+}
+
+PROBE = """
+import gc, json, os, resource, time
+import numpy as np
+from ai_models import core
+from ai_models.optimize import configure_threads, model_reports
+
+configure_threads({concurrency})
+start = time.perf_counter()
+core.registry.get({model!r})
+load_seconds = time.perf_counter() - start
+
+images = core.calibration_images()
+latencies = []
+for i in range({iterations}):
+    start = time.perf_counter()
+    {call}
+    latencies.append((time.perf_counter() - start) * 1000)
+
+gc.collect()
+with open("/proc/self/statm") as f:
+    rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+print(json.dumps({{
+    **model_reports[{model!r}],
+    "load_seconds": load_seconds,
+    "p50_ms": float(np.percentile(latencies, 50)),
+    "p95_ms": float(np.percentile(latencies, 95)),
+    "rss_mb": rss_mb,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def measure(profile: str, model: str, iterations: int, concurrency: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(model=model, call=MODEL_CALLS[model], iterations=iterations, concurrency=concurrency)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, env={**os.environ, "MODEL_PROFILE": profile},
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_CALLS), default=list(MODEL_CALLS))
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent tasks per worker to size threads for")
+    args = parser.parse_args()
+
+    print(f"{'model':<8} {'profile':<14} {'precision':>9} {'accuracy':>9} {'load s':>7} {'p50 ms':>9} {'p95 ms':>9} {'RSS MB':>8} {'peak RSS MB':>12}")
+    for model in args.models:
+        for profile in args.profiles:
+            result = measure(profile, model, args.iterations, args.concurrency)
+            if "error" in result:
+                print(f"{model:<8} {profile:<14} failed: {result['error']}")
+                continue
+            accuracy = f"{result['score']:.3f}" if result["score"] is not None else "-"
+            print(f"{model:<8} {profile:<14} {result['precision']:>9} {accuracy:>9} {result['load_seconds']:>7.1f} "
+                  f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['rss_mb']:>8.0f} {result['peak_rss_mb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
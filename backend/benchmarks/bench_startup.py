@@ -0,0 +1,99 @@
+# backend/benchmarks/bench_startup.py
+"""
+Measures startup time and peak RSS for each process role.
+
+Every role runs in a fresh interpreter so import caches don't leak between them:
+  api          imports the FastAPI app (should load no models)
+  worker-<q>   imports the Celery app and pre-warms the models for queue <q>
+  worker-all   pre-warms every model, matching the old eager-import behavior
+  prefork      pre-warms every model, then forks --children processes that each serve one
+               request per model, like a prefork worker with PRELOAD_BEFORE_FORK=1. Reports
+               the memory private to each child, i.e. what it doesn't share with the parent
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --roles api worker-caption
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROLE_SCRIPTS = {
+    "api": "import main",
+    "worker-caption": "import celery_worker; celery_worker.registry.warm(['caption'])",
+    "worker-vqa": "import celery_worker; celery_worker.registry.warm(['vqa'])",
+    "worker-tts": "import celery_worker; celery_worker.registry.warm(['tts'])",
+    "worker-all": "import celery_worker; celery_worker.registry.warm()",
+    "prefork": """
+import celery_worker
+from ai_models import core
+celery_worker.registry.warm()
+images = core.calibration_images()
+private = []
+for _ in range({children}):
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        core.caption_image(images[0])
+        core.answer_question(images[0], core.CALIBRATION_QUESTIONS[0])
+        core.synthesize_speech(core.CALIBRATION_TEXT)
+        os.write(write_end, str(private_mb()).encode())
+        os._exit(0)
+    os.close(write_end)
+    private.append(float(os.read(read_end, 64)))
+    os.waitpid(pid, 0)
+extra["child_private_mb"] = sum(private) / len(private)
+""",
+}
+
+PROBE = """
+import json, os, resource, sys, time
+
+def private_mb():
+    # Pages this process doesn't share with any other (its own writes after fork, new allocations)
+    with open("/proc/self/smaps_rollup") as f:
+        fields = dict(line.split(":", 1) for line in f if ":" in line)
+    return sum(int(fields[name].split()[0]) for name in ("Private_Clean", "Private_Dirty")) / 1024
+
+extra = {{}}
+start = time.perf_counter()
+{script}
+elapsed = time.perf_counter() - start
+from ai_models.core import registry
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb, "loaded": registry.loaded(), **extra}}))
+"""
+
+
+def measure(role: str, children: int) -> dict:
+    script = ROLE_SCRIPTS[role].replace("{children}", str(children))
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(script=script)],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", nargs="+", choices=list(ROLE_SCRIPTS), default=list(ROLE_SCRIPTS))
+    parser.add_argument("--children", type=int, default=2, help="Children forked by the prefork role")
+    args = parser.parse_args()
+
+    print(f"{'role':<16} {'seconds':>9} {'peak RSS MB':>12} {'child MB':>9}  models loaded")
+    for role in args.roles:
+        result = measure(role, args.children)
+        if "error" in result:
+            print(f"{role:<16} failed: {result['error']}")
+            continue
+        child = f"{result['child_private_mb']:.1f}" if "child_private_mb" in result else "-"
+        print(f"{role:<16} {result['seconds']:>9.2f} {result['rss_mb']:>12.1f} {child:>9}  {', '.join(result['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
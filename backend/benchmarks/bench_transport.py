@@ -0,0 +1,104 @@
+# backend/benchmarks/bench_transport.py
+"""
+Compares the old base64-in-JSON image transport with the blob-store + msgpack transport.
+
+For each mode one "request" goes: upload bytes -> task message pushed through Redis ->
+worker pops the message -> image decoded with PIL. Reported per mode:
+  broker bytes  size of the task message that goes through the broker
+  peak MB       peak Python-heap allocation during the request (tracemalloc)
+  p50 / p99 ms  end-to-end latency
+
+Uses an in-process fakeredis unless --redis-url points at a real server.
+
+    python benchmarks/bench_transport.py --width 4000 --height 3000
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import redis
+from kombu.serialization import dumps, loads
+from PIL import Image
+
+from blob_store import RedisBlobStore, SpoolBlobStore
+
+QUEUE = "visionaryai:bench:queue"
+
+
+def make_image(width: int, height: int) -> bytes:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_request(client, image_bytes: bytes) -> int:
+    image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    content_type, encoding, body = dumps(([image_base64], {}, {}), serializer="json")
+    client.lpush(QUEUE, body)
+
+    args, _, _ = loads(client.rpop(QUEUE), content_type, encoding, accept=[content_type])
+    Image.open(io.BytesIO(base64.b64decode(args[0]))).load()
+    return len(body)
+
+
+def blob_request(client, store, image_bytes: bytes) -> int:
+    image_key = store.put(image_bytes)
+    content_type, encoding, body = dumps(([image_key], {"cache_key": "0" * 64}, {}), serializer="msgpack")
+    client.lpush(QUEUE, body)
+
+    args, _, _ = loads(client.rpop(QUEUE), content_type, encoding, accept=[content_type])
+    Image.open(store.open(args[0])).load()
+    store.delete(args[0])
+    return len(body)
+
+
+def run(label: str, request, image_bytes: bytes, iterations: int):
+    latencies = []
+    peaks = []
+    for _ in range(iterations):
+        tracemalloc.start()
+        start = time.perf_counter()
+        broker_bytes = request(image_bytes)
+        latencies.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+    print(f"{label:<16} {broker_bytes:>14,} {max(peaks):>9.1f} {np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 99):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--redis-url", default=None, help="Real Redis server (default: in-process fakeredis)")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        client = redis.Redis.from_url(args.redis_url)
+    else:
+        import fakeredis
+        client = fakeredis.FakeRedis()
+
+    image_bytes = make_image(args.width, args.height)
+    print(f"{args.width}x{args.height} JPEG, {len(image_bytes):,} bytes, {args.iterations} iterations")
+    print(f"{'mode':<16} {'broker bytes':>14} {'peak MB':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    run("base64 + json", lambda data: legacy_request(client, data), image_bytes, args.iterations)
+    redis_store = RedisBlobStore(redis_client=client)
+    run("redis blob", lambda data: blob_request(client, redis_store, data), image_bytes, args.iterations)
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spool_store = SpoolBlobStore(directory=spool_dir)
+        run("spool blob", lambda data: blob_request(client, spool_store, data), image_bytes, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
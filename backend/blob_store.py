@@ -0,0 +1,176 @@
+# backend/blob_store.py
+import abc
+import io
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Blob store settings (see setup.md for details)
+BLOB_STORE = os.getenv("BLOB_STORE", "redis")  # "redis" or "spool"
+BLOB_STORE_URL = os.getenv("BLOB_STORE_URL", os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0"))
+BLOB_SPOOL_DIR = os.getenv("BLOB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "visionaryai-blobs"))
+BLOB_TTL = int(os.getenv("BLOB_TTL", "3600"))  # seconds
+
+KEY_PREFIX = "visionaryai:blob"
+
+
+class BlobStore(abc.ABC):
+    """
+    Stores raw binary payloads (uploaded images, generated audio) outside the Celery broker.
+
+    Tasks receive a short key instead of the payload itself, so broker messages stay small
+    and the bytes are never base64-encoded.
+    """
+
+    def new_key(self) -> str:
+        return uuid.uuid4().hex
+
+    @abc.abstractmethod
+    def put(self, data: bytes, key: str | None = None, ttl: int | None = None) -> str:
+        ...
+
+    @abc.abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    def open(self, key: str):
+        """
+        Returns a readable binary file object for the blob (e.g. to pass to Image.open).
+        """
+        return io.BytesIO(self.get(key))
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        ...
+
+
+class RedisBlobStore(BlobStore):
+    """
+    Keeps blobs as raw Redis strings with a TTL.
+    """
+
+    def __init__(self, redis_client=None, ttl: int = BLOB_TTL):
+        self.redis = redis_client if redis_client is not None else redis.Redis.from_url(BLOB_STORE_URL)
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{key}"
+
+    def put(self, data: bytes, key: str | None = None, ttl: int | None = None) -> str:
+        key = key or self.new_key()
+        self.redis.set(self._key(key), data, ex=ttl or self.ttl)
+        return key
+
+    def get(self, key: str) -> bytes:
+        data = self.redis.get(self._key(key))
+        if data is None:
+            raise KeyError(f"Blob '{key}' not found or expired")
+        return data
+
+    def delete(self, key: str):
+        self.redis.delete(self._key(key))
+
+
+class SpoolBlobStore(BlobStore):
+    """
+    Keeps blobs as files in a spool directory shared by the API and the workers
+    (same host, or a shared volume). Reads are memory-mapped, so a worker decodes
+    the image straight from the page cache without copying it into Python bytes.
+    """
+
+    CLEANUP_INTERVAL = 60  # seconds between sweeps for expired files
+
+    def __init__(self, directory: str = BLOB_SPOOL_DIR, ttl: int = BLOB_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if not key.replace("-", "").isalnum():
+            raise KeyError(f"Invalid blob key '{key}'")
+        return os.path.join(self.directory, key)
+
+    def put(self, data: bytes, key: str | None = None, ttl: int | None = None) -> str:
+        key = key or self.new_key()
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path) # Atomic, so readers never see a partial file
+        if ttl is not None:
+            # Expiry is based on mtime; push it forward for blobs that should outlive BLOB_TTL
+            expires_at = time.time() + ttl - self.ttl
+            os.utime(path, (expires_at, expires_at))
+        self._maybe_cleanup()
+        return key
+
+    def get(self, key: str) -> bytes:
+        with self.open(key) as f:
+            return f.read()
+
+    def open(self, key: str):
+        try:
+            with open(self._path(key), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return io.BytesIO(b"")
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise KeyError(f"Blob '{key}' not found or expired") from None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _maybe_cleanup(self):
+        now = time.time()
+        if now - self._last_cleanup < self.CLEANUP_INTERVAL or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_cleanup = now
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.stat().st_mtime < now - self.ttl:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+        finally:
+            self._lock.release()
+
+
+BLOB_STORES = {
+    "redis": RedisBlobStore,
+    "spool": SpoolBlobStore,
+}
+
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """
+    Returns the process-wide blob store selected by BLOB_STORE.
+    """
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                if BLOB_STORE not in BLOB_STORES:
+                    raise ValueError(f"Unknown BLOB_STORE '{BLOB_STORE}'. Choose from: {', '.join(BLOB_STORES)}")
+                _blob_store = BLOB_STORES[BLOB_STORE]()
+    return _blob_store
@@ -0,0 +1,355 @@
+# backend/cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from dotenv import load_dotenv
+
+from blob_store import get_blob_store
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Result cache settings (see setup.md for details)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "86400"))  # seconds
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_LOCAL_MAX_ENTRIES", "256"))  # 0 disables the in-process tier
+RESULT_CACHE_INFLIGHT_TTL = int(os.getenv("RESULT_CACHE_INFLIGHT_TTL", "600"))  # seconds
+
+KEY_PREFIX = "visionaryai:cache"
+CACHED_TASK_PREFIX = "cached-"  # Task ids handed out for cache hits
+BLOB_FIELDS = ("audio_key", "pcm_key")  # Result fields that point at blobs owned by the cache entry
+
+
+def normalize_text(text: str, lowercase: bool = False) -> str:
+    """
+    Collapses whitespace (and optionally case) so trivially different inputs share a cache entry.
+    """
+    normalized = " ".join(text.split())
+    return normalized.lower() if lowercase else normalized
+
+
+def make_cache_key(model_id: str, image_bytes: bytes | None = None, text: str | None = None,
+                   image_digest: bytes | None = None) -> str:
+    """
+    Builds a content-addressed key from the model id, the image bytes and the (already normalized) text.
+    Pass `image_digest` (sha256 of the image bytes) instead of `image_bytes` to avoid rehashing
+    the same image for many keys.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_id.encode("utf-8"))
+    digest.update(b"\0")
+    if image_bytes is not None:
+        image_digest = hashlib.sha256(image_bytes).digest()
+    if image_digest is not None:
+        digest.update(image_digest)
+    digest.update(b"\0")
+    if text is not None:
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LocalLRU:
+    """
+    Small thread-safe in-process LRU with per-entry expiry, used in front of Redis.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float | None = None) -> int:
+        """
+        Stores a value for `ttl` seconds (default: the tier's TTL) and returns how many entries
+        were evicted to make room.
+        """
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResultCache:
+    """
+    Redis-backed result cache with TTL, size-bounded LRU eviction, in-flight task
+    deduplication and an optional in-process LRU tier.
+
+    Values are JSON-serializable task results (the same dicts the Celery tasks return).
+    Redis errors never fail a request: the cache logs them and behaves as a miss.
+    """
+
+    def __init__(self, redis_client=None, ttl: int = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 local_max_entries: int = RESULT_CACHE_LOCAL_MAX_ENTRIES, inflight_ttl: int = RESULT_CACHE_INFLIGHT_TTL):
+        self.redis = redis_client if redis_client is not None else redis.Redis.from_url(RESULT_CACHE_URL)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.inflight_ttl = inflight_ttl
+        self.local = LocalLRU(local_max_entries, ttl) if local_max_entries > 0 else None
+        self._local_stats = {"local_hits": 0, "local_evictions": 0}
+
+    # Redis key layout
+    def _value_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:value:{key}"
+
+    def _inflight_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:inflight:{key}"
+
+    @property
+    def _index_key(self) -> str:
+        return f"{KEY_PREFIX}:index"  # Sorted set of keys scored by last access time
+
+    @property
+    def _expiry_key(self) -> str:
+        return f"{KEY_PREFIX}:expiry"  # Same keys scored by when Redis expires their value
+
+    @property
+    def _stats_key(self) -> str:
+        return f"{KEY_PREFIX}:stats"
+
+    def _incr(self, field: str, amount: int = 1):
+        if amount:
+            try:
+                self.redis.hincrby(self._stats_key, field, amount)
+            except redis.RedisError as e:
+                logger.warning(f"Could not update cache counter '{field}': {e}")
+
+    def get(self, key: str):
+        """
+        Returns the cached result for `key`, or None on a miss. Counts a hit or miss, so use it
+        for client-facing lookups only; internal re-checks should use `peek`.
+        """
+        return self._lookup(key, count=True)
+
+    def peek(self, key: str):
+        """
+        Like `get`, but doesn't touch the hit/miss counters (e.g. worker re-checks, status polls).
+        """
+        return self._lookup(key, count=False)
+
+    def _lookup(self, key: str, count: bool):
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                if count:
+                    self._local_stats["local_hits"] += 1
+                self._touch(key, count)
+                return value
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(self._value_key(key))
+            pipe.pttl(self._value_key(key))
+            raw, ttl_ms = pipe.execute()
+            if raw is None:
+                if count:
+                    self._incr("misses")
+                return None
+            self.redis.zadd(self._index_key, {key: time.time()}, xx=True)  # Refresh LRU position
+        except redis.RedisError as e:
+            logger.warning(f"Result cache lookup failed, treating as miss: {e}")
+            return None
+
+        if count:
+            self._incr("hits")
+        value = json.loads(raw)
+        if self._cache_locally(value) and ttl_ms > 0:
+            # Expire the local copy together with the Redis value, not a full TTL after copying it
+            self._local_stats["local_evictions"] += self.local.set(key, value, ttl=ttl_ms / 1000)
+        return value
+
+    def _cache_locally(self, value) -> bool:
+        """
+        Results that point at blobs stay out of the local tier: another process can evict the
+        entry and delete its blobs, and only that process's local tier would learn about it.
+        """
+        if self.local is None:
+            return False
+        return not (isinstance(value, dict) and any(value.get(field) for field in BLOB_FIELDS))
+
+    def _touch(self, key: str, count: bool):
+        """
+        Refreshes the Redis LRU position of a key served from the local tier, so hot keys
+        don't look idle to Redis and get evicted first.
+        """
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(self._index_key, {key: time.time()}, xx=True)  # Only if Redis still has it
+            if count:
+                pipe.hincrby(self._stats_key, "hits", 1)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not refresh cache entry: {e}")
+
+    def set(self, key: str, value):
+        """
+        Stores a result and evicts the least recently used entries beyond `max_entries`.
+        """
+        if self._cache_locally(value):
+            self._local_stats["local_evictions"] += self.local.set(key, value)
+
+        now = time.time()
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(self._value_key(key), json.dumps(value), ex=self.ttl)
+            pipe.zadd(self._index_key, {key: now})
+            pipe.zadd(self._expiry_key, {key: now + self.ttl})
+            pipe.execute()
+            size = self._prune_expired(now)
+
+            overflow = size - self.max_entries
+            if overflow > 0:
+                evicted = [k.decode("utf-8") if isinstance(k, bytes) else k
+                           for k, _ in self.redis.zpopmin(self._index_key, overflow)]
+                if evicted:
+                    value_keys = [self._value_key(k) for k in evicted]
+                    values = self.redis.mget(value_keys)
+                    self.redis.delete(*value_keys)
+                    self.redis.zrem(self._expiry_key, *evicted)
+                    self._incr("evictions", len(evicted))
+                    self._drop_evicted(evicted, values)
+        except redis.RedisError as e:
+            logger.warning(f"Could not store result in cache: {e}")
+
+    def _prune_expired(self, now: float) -> int:
+        """
+        Removes keys whose value Redis has already expired from the index, so they neither count
+        towards `max_entries` nor push live entries out. Returns the number of indexed keys.
+        """
+        pipe = self.redis.pipeline()
+        pipe.zrangebyscore(self._expiry_key, "-inf", now)
+        pipe.zremrangebyscore(self._expiry_key, "-inf", now)
+        expired = pipe.execute()[0]
+        pipe = self.redis.pipeline()
+        if expired:
+            pipe.zrem(self._index_key, *expired)
+        pipe.zcard(self._index_key)
+        return pipe.execute()[-1]
+
+    def _drop_evicted(self, keys: list, values: list):
+        """
+        Removes evicted entries from this process's local tier and deletes the blobs they
+        referenced (e.g. generated audio), which would otherwise outlive the entry until BLOB_TTL.
+        """
+        if self.local is not None:
+            for key in keys:
+                self.local.discard(key)
+        blob_keys = []
+        for value in values:
+            if value is None:
+                continue
+            try:
+                result = json.loads(value)
+            except ValueError:
+                continue
+            if isinstance(result, dict):
+                blob_keys.extend(result[field] for field in BLOB_FIELDS if result.get(field))
+        for blob_key in blob_keys:
+            try:
+                get_blob_store().delete(blob_key)
+            except Exception as e:
+                logger.warning(f"Could not delete blob {blob_key} of an evicted cache entry: {e}")
+
+    def claim_inflight(self, key: str, task_id: str) -> tuple[str, bool]:
+        """
+        Registers `task_id` as the task computing `key`.
+
+        Returns (task_id, True) if the claim succeeded, or (existing_task_id, False) if an
+        identical request is already running and the caller should attach to it instead.
+        """
+        try:
+            if self.redis.set(self._inflight_key(key), task_id, nx=True, ex=self.inflight_ttl):
+                return task_id, True
+            existing = self.redis.get(self._inflight_key(key))
+        except redis.RedisError as e:
+            logger.warning(f"In-flight deduplication unavailable: {e}")
+            return task_id, True
+
+        if existing is None:  # The other task finished between SET and GET
+            return self.claim_inflight(key, task_id)
+        self._incr("inflight_joins")
+        return existing.decode("utf-8") if isinstance(existing, bytes) else existing, False
+
+    def release_inflight(self, key: str, task_id: str | None = None):
+        """
+        Clears the in-flight marker for `key`. With `task_id`, only if that task still owns it.
+        """
+        try:
+            if task_id is not None:
+                owner = self.redis.get(self._inflight_key(key))
+                if owner is None or (owner.decode("utf-8") if isinstance(owner, bytes) else owner) != task_id:
+                    return
+            self.redis.delete(self._inflight_key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Could not release in-flight marker: {e}")
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters (shared across processes) plus this process's local tier counters.
+        """
+        stats = {"hits": 0, "misses": 0, "evictions": 0, "inflight_joins": 0, "size": None}
+        try:
+            for field, value in self.redis.hgetall(self._stats_key).items():
+                field = field.decode("utf-8") if isinstance(field, bytes) else field
+                stats[field] = int(value)
+            stats["size"] = self._prune_expired(time.time())
+        except redis.RedisError as e:
+            logger.warning(f"Could not read cache statistics: {e}")
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl
+        if self.local is not None:
+            stats.update(self._local_stats)
+            stats["local_size"] = len(self.local)
+        return stats
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """
+    Returns the process-wide ResultCache, or None when caching is disabled.
+    """
+    global _result_cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
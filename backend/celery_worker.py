@@ -1,18 +1,29 @@
 # backend/celery_worker.py
 from celery import Celery
+from kombu import Queue
+from billiard.process import current_process
+from celery.signals import (worker_init, worker_process_init, worker_ready, before_task_publish,
+                            task_prerun, task_postrun, task_success, task_failure)
 import os
+import time
 from dotenv import load_dotenv
 
-from transformers import pipeline, AutoProcessor, MusicgenForConditionalGeneration
 from PIL import Image
-import io
-import base64
+from concurrent.futures import ThreadPoolExecutor
 
-import scipy.io.wavfile as wavfile
 import numpy as np
 
 # to replace old model loading
-from ai_models.core import captioner, vqa_pipeline, tts_processor, tts_model
+from ai_models.core import registry, caption_image, answer_question, caption_batch, answer_questions, synthesize_speech, TTS_MODEL_ID
+from ai_models.batching import INFERENCE_BATCH_MAX_SIZE
+from ai_models.optimize import configure_threads
+from ai_models.speech import split_text, to_pcm16, encode_audio, speech_cache_key
+
+from cache import get_result_cache, make_cache_key, normalize_text, RESULT_CACHE_ENABLED, RESULT_CACHE_TTL
+from blob_store import get_blob_store, BLOB_TTL
+from events import publish_task_event
+from metrics import (TASK_SECONDS, MULTIPROCESS_DIR, stage_timer, observe_stage, start_metrics_server,
+                     get_trace_id, set_trace_id, reset_trace_id, new_trace_id)
 
 import logging
 
@@ -36,14 +47,182 @@ logger = logging.getLogger(__name__)
 
 celery_app.conf.update(
     task_track_started=True,
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # msgpack keeps messages binary and compact; payloads themselves travel through the blob store
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
+    result_serializer='msgpack',
     timezone='UTC',
     enable_utc=True,
-    broker_connection_retry_on_startup=True # Important for Docker scenarios
+    broker_connection_retry_on_startup=True, # Important for Docker scenarios
+    # Each model gets its own queue so a worker only loads what it serves, e.g.
+    # `celery -A celery_worker worker -Q caption` never loads MusicGen. A worker started
+    # without -Q consumes every queue declared here.
+    task_default_queue='celery',
+    task_queues=[Queue('celery'), Queue('caption'), Queue('vqa'), Queue('tts')],
+    task_routes={
+        'celery_worker.generate_caption': {'queue': 'caption'},
+        'celery_worker.caption_images': {'queue': 'caption'},
+        'celery_worker.answer_question_on_image': {'queue': 'vqa'},
+        'celery_worker.answer_questions_on_image': {'queue': 'vqa'},
+        'celery_worker.generate_speech': {'queue': 'tts'},
+    },
 )
 
+def task_operation(task_name: str) -> str:
+    """
+    The queue a task is routed to, which doubles as the `operation` label of its stage metrics.
+    """
+    return celery_app.conf.task_routes.get(task_name, {}).get('queue', 'default')
+
+# Models served by each queue, used to decide what a worker pre-warms
+QUEUE_MODELS = {
+    'caption': ['caption'],
+    'vqa': ['vqa'],
+    'tts': ['tts'],
+}
+
+# PRELOAD_MODELS: "auto" (models for the queues this worker consumes), "none", or a comma-separated list
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "auto")
+# With the prefork pool, load the models in the parent before it forks so the children share the
+# weights copy-on-write instead of each holding its own copy. Set to 0 to load them in every child.
+PRELOAD_BEFORE_FORK = os.getenv("PRELOAD_BEFORE_FORK", "1") == "1"
+
+_preload = []
+_prefork = False
+_concurrency = 1
+
+@worker_init.connect
+def select_models_to_preload(sender, **kwargs):
+    """
+    Works out which models this worker should pre-warm from PRELOAD_MODELS and its -Q queues.
+    """
+    global _preload, _prefork, _concurrency
+    if PRELOAD_MODELS == "none":
+        _preload = []
+    elif PRELOAD_MODELS == "auto":
+        queues = sender.app.amqp.queues.consume_from.keys()
+        _preload = sorted({name for queue in queues for name in QUEUE_MODELS.get(queue, [])})
+    else:
+        _preload = [name.strip() for name in PRELOAD_MODELS.split(",") if name.strip()]
+    # Prefork children run the tasks; other pools run tasks in this process
+    _prefork = 'prefork' in str(sender.pool_cls).lower()
+    # Number of forward passes that can run at once on this worker's cores (see configure_threads)
+    _concurrency = 1 if 'solo' in str(sender.pool_cls).lower() else sender.concurrency
+    logger.info(f"Models to pre-warm: {', '.join(_preload) or 'none'}")
+    # worker_init fires before the pool starts, so models loaded here are inherited by every child
+    if _prefork and PRELOAD_BEFORE_FORK:
+        registry.warm(_preload)
+
+@worker_init.connect
+def serve_worker_metrics(sender, **kwargs):
+    if 'prefork' in str(sender.pool_cls).lower() and not MULTIPROCESS_DIR:
+        logger.warning("Prefork pool without PROMETHEUS_MULTIPROC_DIR: task metrics from child processes won't be exported")
+    start_metrics_server()
+
+@worker_process_init.connect
+def warm_models_in_child(**kwargs):
+    if _prefork:
+        configure_threads(_concurrency, worker_index=getattr(current_process(), 'index', None))
+        if not PRELOAD_BEFORE_FORK:
+            registry.warm(_preload)
+
+@worker_ready.connect
+def warm_models_in_worker(**kwargs):
+    if not _prefork:
+        configure_threads(_concurrency)
+        registry.warm(_preload)
+
+# Carry the API request's trace id into the task, and time how long messages wait in the queue.
+# Chained tasks are published from the worker and inherit the trace id of the task that sent them.
+@before_task_publish.connect
+def add_trace_headers(headers=None, **kwargs):
+    headers.setdefault('trace_id', get_trace_id() or new_trace_id())
+    headers['published_at'] = time.time()
+
+_running = {} # task_id -> (start time, trace id token)
+
+@task_prerun.connect
+def start_task_trace(task_id=None, task=None, **kwargs):
+    trace_id = getattr(task.request, 'trace_id', None)
+    published_at = getattr(task.request, 'published_at', None)
+    _running[task_id] = (time.perf_counter(), set_trace_id(trace_id))
+    if published_at is not None:
+        observe_stage(task_operation(task.name), 'queue_wait', max(0.0, time.time() - published_at))
+    logger.info(f"Task {task.name}[{task_id}] started (trace {trace_id})")
+
+@task_postrun.connect
+def finish_task_trace(task_id=None, task=None, state=None, **kwargs):
+    started = _running.pop(task_id, None)
+    if started is not None:
+        start, token = started
+        TASK_SECONDS.labels(task=task.name, state=state or 'UNKNOWN').observe(time.perf_counter() - start)
+        reset_trace_id(token)
+
+# Push task state changes to the API (SSE/WebSocket/long-poll) as they happen
+@task_prerun.connect
+def publish_task_started(task_id=None, **kwargs):
+    publish_task_event(task_id, 'STARTED')
+
+@task_success.connect
+def publish_task_succeeded(sender=None, result=None, **kwargs):
+    publish_task_event(sender.request.id, 'SUCCESS', result)
+
+@task_failure.connect
+def publish_task_failed(task_id=None, exception=None, **kwargs):
+    publish_task_event(task_id, 'FAILURE', {'exc_type': type(exception).__name__, 'exc_message': str(exception)})
+
+def report_progress(task, task_id: str | None = None, **meta):
+    """
+    Records intermediate progress in the result backend and pushes it to subscribers.
+    Pass `task_id` when calling from a helper thread (the task request context is thread-local).
+    """
+    task_id = task_id or task.request.id
+    task.update_state(task_id=task_id, state='PROGRESS', meta=meta)
+    publish_task_event(task_id, 'PROGRESS', meta)
+
+def _cached_result(cache_key: str | None):
+    """
+    Returns a result another worker already stored for this key (e.g. after a duplicate was queued).
+    """
+    result_cache = get_result_cache()
+    if cache_key is None or result_cache is None:
+        return None
+    return result_cache.peek(cache_key)
+
+def _finish_cached(task, cache_key: str | None, result: dict | None = None):
+    """
+    Stores a successful result under its cache key and releases the in-flight marker
+    (if this task owns it) so later identical requests are served from the cache.
+    """
+    result_cache = get_result_cache()
+    if cache_key is None or result_cache is None:
+        return
+    with stage_timer(task_operation(task.name), 'result_store'):
+        if result is not None:
+            result_cache.set(cache_key, result)
+        result_cache.release_inflight(cache_key, task_id=task.request.id)
+
+def _decode_image(image_key: str, operation: str):
+    with stage_timer(operation, 'decode'):
+        image = Image.open(get_blob_store().open(image_key))
+        image.load() # Decode now so the time isn't attributed to preprocessing
+    return image
+
+def _delete_images(*image_keys):
+    """
+    Drops uploaded images from the blob store once their task is done with them. Every queued
+    task gets its own blob, so nothing else reads it afterwards; BLOB_TTL only covers blobs of
+    tasks that never ran.
+    """
+    blob_store = get_blob_store()
+    for image_key in image_keys:
+        if image_key is None:
+            continue
+        try:
+            blob_store.delete(image_key)
+        except Exception as e:
+            logger.warning(f"Could not delete image blob {image_key}: {e}")
+
 @celery_app.task
 def debug_task(message):
     """
@@ -53,63 +232,232 @@ def debug_task(message):
     return f"Task completed: {message}"
 
 @celery_app.task(bind=True)
-def generate_caption(self, image_base64_string: str):
+def generate_caption(self, image_key: str, cache_key: str | None = None):
     try:
-        # Decode the base64 string to bytes
-        image_bytes = base64.b64decode(image_base64_string)
-        # Open the image using PIL
-        image = Image.open(io.BytesIO(image_bytes))
+        cached = _cached_result(cache_key)
+        if cached is not None:
+            _finish_cached(self, cache_key)
+            return cached
+
+        # Open the image straight from the blob store (memory-mapped for the spool backend)
+        image = _decode_image(image_key, 'caption')
+        report_progress(self, stage='inference')
 
         # Generate caption
-        caption = captioner(image)[0]['generated_text']
+        caption = caption_image(image)
 
         # print(f"Generated caption: {caption}")
         logger.info(f"Generated caption: {caption}")
-        return {"caption": caption}
+        result = {"caption": caption}
+        _finish_cached(self, cache_key, result)
+        return result
     except Exception as e:
+        _finish_cached(self, cache_key)
         self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)}) # Update task state on failure
         # print(f"Error generating caption: {e}")
         logger.error(f"Error generating caption: {e}", exc_info=True) # exc_info=True to log traceback
         raise # Re-raise the exception to mark the task as failed
+    finally:
+        _delete_images(image_key)
 
 @celery_app.task(bind=True)
-def answer_question_on_image(self, image_base64_string: str, question: str):
+def answer_question_on_image(self, image_key: str, question: str, cache_key: str | None = None):
     try:
-        image_bytes = base64.b64decode(image_base64_string)
-        image = Image.open(io.BytesIO(image_bytes))
+        cached = _cached_result(cache_key)
+        if cached is not None:
+            _finish_cached(self, cache_key)
+            return cached
+
+        image = _decode_image(image_key, 'vqa')
+        report_progress(self, stage='inference')
 
         # Generate answer
-        answer = vqa_pipeline(image=image, question=question)[0]['answer']
+        answer = answer_question(image, question)
 
         # print(f"Answer for '{question}': {answer}")
         logger.info(f"Answer for '{question}': {answer}")
-        return {"answer": answer}
+        result = {"answer": answer}
+        _finish_cached(self, cache_key, result)
+        return result
     except Exception as e:
+        _finish_cached(self, cache_key)
         self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)}) # Update task state on failure
         # print(f"Error answering question: {e}")
         logger.error(f"Error answering question: {e}", exc_info=True)
         raise
+    finally:
+        _delete_images(image_key)
+
+def _report_items(task, items: list, fields: tuple):
+    """
+    Publishes every finished item of a batch job so far, so clients can show results as they complete.
+    """
+    done = [{field: item[field] for field in fields} for item in items if item.get(fields[-1]) is not None]
+    report_progress(task, stage='items', completed=len(done), total=len(items), items=done)
+    return done
+
+@celery_app.task(bind=True)
+def answer_questions_on_image(self, image_key: str, items: list):
+    """
+    Answers several questions about one image. The image is decoded and preprocessed once and
+    the questions run in batches of INFERENCE_BATCH_MAX_SIZE; answers are published per batch.
+    `items` are {"index", "question", "cache_key", "answer"} dicts; items the API already
+    answered from the cache arrive with an answer and are passed through.
+    """
+    try:
+        result_cache = get_result_cache()
+        pending = [item for item in items if item.get("answer") is None]
+        _report_items(self, items, ("index", "question", "answer"))
+
+        image = _decode_image(image_key, 'vqa') if pending else None
+        for start in range(0, len(pending), INFERENCE_BATCH_MAX_SIZE):
+            batch = pending[start:start + INFERENCE_BATCH_MAX_SIZE]
+            answers = answer_questions(image, [item["question"] for item in batch])
+            with stage_timer('vqa', 'result_store'):
+                for item, answer in zip(batch, answers):
+                    item["answer"] = answer
+                    if result_cache is not None:
+                        result_cache.set(item["cache_key"], {"answer": answer}) # Shared with /answer_question
+            _report_items(self, items, ("index", "question", "answer"))
+
+        logger.info(f"Answered {len(items)} questions ({len(pending)} computed)")
+        return {"answers": [{"index": item["index"], "question": item["question"], "answer": item["answer"]} for item in items]}
+    except Exception as e:
+        self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)}) # Update task state on failure
+        logger.error(f"Error answering questions: {e}", exc_info=True)
+        raise
+    finally:
+        _delete_images(image_key)
 
 @celery_app.task(bind=True)
-def generate_speech(self, text: str):
+def caption_images(self, items: list):
+    """
+    Captions many images (e.g. a bulk alt-text job) in batches of INFERENCE_BATCH_MAX_SIZE,
+    publishing captions per batch. `items` are {"index", "filename", "image_key", "cache_key",
+    "caption"} dicts; items the API already captioned from the cache are passed through.
+    """
     try:
-        inputs = tts_processor(text=text, sampling_rate=tts_model.config.sampling_rate, return_tensors="pt")
-        audio_values = tts_model.generate(**inputs, do_sample=True, guidance_scale=3.0, max_new_tokens=256)
-        # Convert audio to a suitable format (e.g., WAV bytes) and base64 encode
-        audio_np = audio_values[0, 0].cpu().numpy()
-        # Normalize to 16-bit PCM for WAV
-        audio_np = (audio_np * 32767).astype(np.int16)
-
-        # Save to a BytesIO object (in-memory file) as WAV
-        buffer = io.BytesIO()
-        wavfile.write(buffer, tts_model.config.sampling_rate, audio_np)
-
-        audio_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-        # print(f"Generated speech for: '{text}' (size: {len(audio_base64) / 1024:.2f} KB)")
-        logger.info(f"Generated speech for '{text}' (size: {len(audio_base64) / 1024:.2f} KB)")
-        return {"audio_base64": audio_base64, "format": "wav"}
+        result_cache = get_result_cache()
+        pending = [item for item in items if item.get("caption") is None]
+        _report_items(self, items, ("index", "filename", "caption"))
+
+        for start in range(0, len(pending), INFERENCE_BATCH_MAX_SIZE):
+            batch = pending[start:start + INFERENCE_BATCH_MAX_SIZE]
+            images = [_decode_image(item["image_key"], 'caption') for item in batch]
+            _delete_images(*(item["image_key"] for item in batch))
+            captions = caption_batch(images)
+            with stage_timer('caption', 'result_store'):
+                for item, caption in zip(batch, captions):
+                    item["caption"] = caption
+                    if result_cache is not None:
+                        result_cache.set(item["cache_key"], {"caption": caption}) # Shared with /caption_image
+            _report_items(self, items, ("index", "filename", "caption"))
+
+        logger.info(f"Captioned {len(items)} images ({len(pending)} computed)")
+        return {"captions": [{"index": item["index"], "filename": item["filename"], "caption": item["caption"]} for item in items]}
+    except Exception as e:
+        self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)}) # Update task state on failure
+        logger.error(f"Error captioning images: {e}", exc_info=True)
+        raise
+    finally:
+        _delete_images(*(item.get("image_key") for item in items if item.get("caption") is None))
+
+# Generated audio must live as long as the cached result that points at it; evicting the
+# result deletes the audio too (see ResultCache). Streaming chunks are only read while the
+# task runs, so they keep the default BLOB_TTL.
+AUDIO_TTL = max(BLOB_TTL, RESULT_CACHE_TTL) if RESULT_CACHE_ENABLED else BLOB_TTL
+# Only chunks up to this many characters go through the phrase cache. Short answers ("yes",
+# "two", "red") recur constantly; longer text rarely repeats and would only fill the cache.
+TTS_PHRASE_CACHE_MAX_CHARS = int(os.getenv("TTS_PHRASE_CACHE_MAX_CHARS", "40"))
+
+def _synthesize_phrase(text: str):
+    """
+    Synthesizes one chunk of text, reusing audio from the phrase cache when the same short
+    phrase was spoken before. Returns (int16 PCM, sampling rate).
+    """
+    result_cache = get_result_cache() if len(text) <= TTS_PHRASE_CACHE_MAX_CHARS else None
+    blob_store = get_blob_store()
+    phrase_key = make_cache_key(f"{TTS_MODEL_ID}#phrase", text=normalize_text(text))
+    cached = result_cache.peek(phrase_key) if result_cache is not None else None
+    if cached is not None:
+        try:
+            pcm = np.frombuffer(blob_store.get(cached["pcm_key"]), dtype=np.int16)
+            return pcm, cached["sampling_rate"]
+        except KeyError:
+            pass # Audio blob expired before the cache entry; synthesize again
+
+    audio, sampling_rate = synthesize_speech(text)
+    with stage_timer('tts', 'postprocess'):
+        pcm = to_pcm16(audio)
+    if result_cache is not None:
+        with stage_timer('tts', 'result_store'):
+            pcm_key = blob_store.put(pcm.tobytes(), ttl=AUDIO_TTL)
+            result_cache.set(phrase_key, {"pcm_key": pcm_key, "sampling_rate": sampling_rate})
+    return pcm, sampling_rate
+
+def _publish_chunk(task, task_id: str, chunks: list, total: int, pcm, sampling_rate: int, audio_format: str):
+    """
+    Encodes one synthesized chunk and pushes it to subscribers as a PROGRESS event.
+    Events carry every chunk so far, so late subscribers can catch up from the snapshot.
+    """
+    with stage_timer('tts', 'postprocess'):
+        audio_bytes = encode_audio(pcm, sampling_rate, audio_format)
+    with stage_timer('tts', 'result_store'):
+        audio_key = get_blob_store().put(audio_bytes)
+    chunks.append({
+        "index": len(chunks),
+        "audio_key": audio_key,
+        "audio_url": f"/blobs/{audio_key}?format={audio_format}",
+        "sampling_rate": sampling_rate,
+        "format": audio_format,
+        "size": len(audio_bytes),
+    })
+    report_progress(task, task_id=task_id, stage='audio_chunk', total=total, chunks=list(chunks))
+
+@celery_app.task(bind=True)
+def generate_speech(self, text: str | dict, cache_key: str | None = None, audio_format: str = "wav", stream: bool = False):
+    try:
+        if isinstance(text, dict): # Chained after generate_caption (/describe_image)
+            text = text["caption"]
+            cache_key = speech_cache_key(text, audio_format)
+
+        cached = _cached_result(cache_key)
+        if cached is not None:
+            _finish_cached(self, cache_key)
+            return cached
+
+        report_progress(self, stage='inference')
+        # In streaming mode the text is spoken chunk by chunk; each chunk is encoded and published
+        # on a helper thread while the next one is being synthesized.
+        texts = (split_text(text) if stream else None) or [text] # split_text returns [] for blank text
+        chunks = []
+        pieces = []
+        with ThreadPoolExecutor(max_workers=1) as encoder:
+            published = []
+            for chunk_text in texts:
+                pcm, sampling_rate = _synthesize_phrase(chunk_text)
+                pieces.append(pcm)
+                if stream:
+                    published.append(encoder.submit(_publish_chunk, self, self.request.id, chunks, len(texts),
+                                                    pcm, sampling_rate, audio_format))
+            for future in published:
+                future.result() # Surface encoding errors
+
+        # Store the complete audio as raw bytes; clients download it from /blobs/{audio_key}.
+        with stage_timer('tts', 'postprocess'):
+            audio_bytes = encode_audio(np.concatenate(pieces), sampling_rate, audio_format)
+        with stage_timer('tts', 'result_store'):
+            audio_key = get_blob_store().put(audio_bytes, ttl=AUDIO_TTL)
+
+        # print(f"Generated speech for: '{text}' (size: {len(audio_bytes) / 1024:.2f} KB)")
+        logger.info(f"Generated speech for '{text}' in {len(texts)} chunk(s) (size: {len(audio_bytes) / 1024:.2f} KB)")
+        result = {"text": text, "audio_key": audio_key, "audio_url": f"/blobs/{audio_key}?format={audio_format}", "format": audio_format, "size": len(audio_bytes)}
+        # The cached copy leaves out the chunks: they expire with BLOB_TTL, and later requests
+        # are served the complete audio
+        _finish_cached(self, cache_key, result)
+        return {**result, "chunks": chunks} if stream else result
     except Exception as e:
+        _finish_cached(self, cache_key)
         self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)}) # Update task state on failure 
         # print(f"Error generating speech: {e}") 
         logger.error(f"Error generating speech: {e}", exc_info=True)
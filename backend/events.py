@@ -0,0 +1,221 @@
+# backend/events.py
+import asyncio
+import json
+import logging
+import os
+import threading
+
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Task events are published on Redis pub/sub so the API can push them instead of clients polling
+TASK_EVENTS_URL = os.getenv("TASK_EVENTS_URL", os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0"))
+TASK_EVENTS_KEEPALIVE = float(os.getenv("TASK_EVENTS_KEEPALIVE", "15"))  # seconds between SSE keep-alive comments
+
+CHANNEL_PREFIX = "visionaryai:task_events:"
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+# Queued to every subscription after the hub (re)subscribes: events published while it wasn't
+# subscribed are lost, so subscriptions re-read the state of their tasks
+RESYNC = {"task_id": None, "status": "RESYNC", "result": None}
+
+
+def channel_for(task_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{task_id}"
+
+
+def make_event(task_id: str, status: str, result=None) -> dict:
+    """
+    Events have the same shape as /task_status responses.
+    """
+    return {"task_id": task_id, "status": status, "result": result}
+
+
+# Publishing (worker side, synchronous)
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = redis.Redis.from_url(TASK_EVENTS_URL)
+    return _publisher
+
+
+def publish_task_event(task_id: str, status: str, result=None):
+    """
+    Publishes a task state change. Failures are logged, never raised: subscriptions re-read
+    the task state whenever no event arrives for a keep-alive interval, so a missed event
+    only delays the update.
+    """
+    try:
+        _get_publisher().publish(channel_for(task_id), json.dumps(make_event(task_id, status, result), default=str))
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish {status} event for task {task_id}: {e}")
+
+
+# Subscribing (API side, asyncio)
+class TaskEventHub:
+    """
+    Per-process fan-out of task events.
+
+    A single pattern subscription receives every task event and routes it to the
+    in-memory queues of the connections waiting on that task id, so thousands of
+    SSE/WebSocket clients share one Redis connection.
+    """
+
+    def __init__(self, redis_url: str = TASK_EVENTS_URL):
+        self.redis_url = redis_url
+        self._listeners = {} # task_id -> set of asyncio.Queue
+        self._reader = None
+
+    def _ensure_started(self):
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.get_running_loop().create_task(self._read_events())
+
+    async def _read_events(self):
+        client = aioredis.Redis.from_url(self.redis_url)
+        pubsub = client.pubsub()
+        while True:
+            try:
+                if not pubsub.subscribed:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    self._resync()
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                event = json.loads(message["data"])
+                for queue in list(self._listeners.get(event["task_id"], ())):
+                    queue.put_nowait(event)
+            except asyncio.CancelledError:
+                await pubsub.reset()
+                await client.close()
+                raise
+            except Exception as e:
+                logger.warning(f"Task event reader error, retrying: {e}")
+                await pubsub.reset()
+                await asyncio.sleep(1.0)
+
+    def _resync(self):
+        queues = {queue for listeners in self._listeners.values() for queue in listeners}
+        for queue in queues:
+            queue.put_nowait(RESYNC)
+
+    def register(self, task_id: str, queue: asyncio.Queue):
+        self._ensure_started()
+        self._listeners.setdefault(task_id, set()).add(queue)
+
+    def unregister(self, task_id: str, queue: asyncio.Queue):
+        listeners = self._listeners.get(task_id)
+        if listeners is not None:
+            listeners.discard(queue)
+            if not listeners:
+                del self._listeners[task_id]
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+
+
+_hub = None
+
+
+def get_task_event_hub() -> TaskEventHub:
+    global _hub
+    if _hub is None:
+        _hub = TaskEventHub()
+    return _hub
+
+
+class TaskEventSubscription:
+    """
+    Events for any number of task ids, multiplexed onto one client connection.
+
+    `snapshot` is an async callable returning the current event for a task id (e.g. from the
+    Celery result backend). It is checked right after registering so tasks that finished before
+    the subscription existed are still reported, and again whenever no event arrived for a
+    whole `next_event` timeout or the hub had to resubscribe, so lost events can't stall a client.
+    """
+
+    def __init__(self, snapshot, hub: TaskEventHub | None = None):
+        self.snapshot = snapshot
+        self.hub = hub or get_task_event_hub()
+        self.pending = set()
+        self._delivered = {} # task_id -> last event returned for it
+        self._queue = asyncio.Queue()
+
+    async def add(self, task_ids):
+        new_ids = [task_id for task_id in task_ids if task_id not in self.pending]
+        for task_id in new_ids:
+            self.pending.add(task_id)
+            self.hub.register(task_id, self._queue)
+        await self.refresh(new_ids)
+
+    async def refresh(self, task_ids=None):
+        """
+        Queues the current state of `task_ids` (default: every pending task) if it differs from
+        the last event delivered for it.
+        """
+        for task_id in list(self.pending if task_ids is None else task_ids):
+            try:
+                event = await self.snapshot(task_id)
+            except Exception as e:
+                logger.warning(f"Could not read the state of task {task_id}: {e}")
+                continue
+            if event["status"] != "PENDING" and event != self._delivered.get(task_id):
+                self._queue.put_nowait(event)
+
+    async def next_event(self, timeout: float):
+        """
+        Returns the next event for a pending task, or None if nothing arrived within `timeout`.
+        Tasks are dropped from the subscription once they reach a terminal state.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        refreshed = False
+        while True:
+            if self._queue.empty():
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    event = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    if refreshed:
+                        return None
+                    await self.refresh() # Nothing arrived: the event may have been lost
+                    refreshed = True
+                    continue
+            else:
+                event = self._queue.get_nowait()
+
+            if event is RESYNC:
+                await self.refresh()
+                continue
+            task_id = event["task_id"]
+            if task_id not in self.pending or event == self._delivered.get(task_id):
+                continue # Duplicate of an event we already delivered (snapshot raced with publish)
+            self._delivered[task_id] = event
+            if event["status"] in TERMINAL_STATES:
+                self.pending.discard(task_id)
+                self._delivered.pop(task_id, None)
+                self.hub.unregister(task_id, self._queue)
+            return event
+
+    def close(self):
+        for task_id in self.pending:
+            self.hub.unregister(task_id, self._queue)
+        self.pending.clear()
+        self._delivered.clear()
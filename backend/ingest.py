@@ -0,0 +1,342 @@
+# backend/ingest.py
+import asyncio
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import httpcore
+import httpx
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from starlette.responses import JSONResponse
+
+from cache import LocalLRU
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Image ingest settings (see setup.md for details)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+# BLIP and ViLT both work at 384px, so larger images are shrunk until their shorter side is this size
+INGEST_TARGET_SIZE = int(os.getenv("INGEST_TARGET_SIZE", "384"))
+INGEST_JPEG_QUALITY = int(os.getenv("INGEST_JPEG_QUALITY", "90"))
+
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))  # seconds
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))
+FETCH_CACHE_TTL = int(os.getenv("FETCH_CACHE_TTL", "600"))  # seconds
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "512"))
+FETCH_ALLOW_PRIVATE = os.getenv("FETCH_ALLOW_PRIVATE", "0") == "1"  # Allow URLs that resolve to private/loopback addresses
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# PIL's own guard, as a backstop to the explicit header check below
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class ImageIngestError(ValueError):
+    """
+    An image was rejected during ingest. `status_code` is the HTTP status to report.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class IngestedImage:
+    """
+    An accepted image. `digest` (sha256 of the original bytes) keys the result cache; the
+    normalized bytes are only produced by `prepare()` when a task actually has to be queued.
+    """
+    digest: bytes
+    original_size: int
+    raw: bytes | None = None
+    normalized: bytes | None = None
+
+    async def prepare(self) -> bytes:
+        if self.normalized is None:
+            self.normalized = await asyncio.to_thread(normalize_image, self.raw)
+            self.raw = None # Only the normalized copy is needed from here on
+        return self.normalized
+
+
+async def read_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple[bytes, bytes]:
+    """
+    Reads an UploadFile in chunks, hashing as it goes and rejecting it once it exceeds `max_bytes`.
+    Returns (bytes, sha256 digest).
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await upload.read(READ_CHUNK_SIZE):
+        if len(buffer) + len(chunk) > max_bytes:
+            raise ImageIngestError(f"Image exceeds the {max_bytes // (1024 * 1024)} MB upload limit.", status_code=413)
+        digest.update(chunk)
+        buffer.extend(chunk)
+    if not buffer:
+        raise ImageIngestError("Uploaded image is empty.")
+    return bytes(buffer), digest.digest()
+
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware that counts request body bytes as they are received and answers 413 once
+    they exceed `max_bytes` (default MAX_REQUEST_BYTES), so chunked requests without a
+    Content-Length are capped too. Per-image limits are enforced while reading each upload
+    (see read_upload).
+
+    The 413 is sent from here: past the limit the app only sees the client disconnecting, and
+    whatever it responds with is dropped. Raising from `receive` instead would surface as
+    whatever error the body parser turns it into.
+    """
+
+    def __init__(self, app, max_bytes: int | None = None):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        max_bytes = self.max_bytes if self.max_bytes is not None else MAX_REQUEST_BYTES
+        too_large = JSONResponse(status_code=413, content={"detail": "Request body is too large."})
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            return await too_large(scope, receive, send)
+
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, rejected, response_started
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    rejected = True
+                    if not response_started:
+                        response_started = True
+                        await too_large(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return # The 413 has been sent; drop the app's own response
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+
+def normalize_image(data: bytes, target_size: int = INGEST_TARGET_SIZE) -> bytes:
+    """
+    Decodes an image at the lowest resolution the models need and re-encodes it compactly.
+
+    - rejects decompression bombs from the header, before any pixels are decoded
+    - uses JPEG draft mode to decode at a reduced DCT scale instead of full resolution
+    - applies the EXIF orientation and converts to RGB (transparency composited on white)
+    - shrinks the shorter side to `target_size`
+
+    Images that are already small RGB JPEG/PNG files are passed through unchanged.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ImageIngestError(str(e), status_code=413) from None
+    except Exception:
+        raise ImageIngestError("Could not decode the image.") from None
+
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageIngestError(f"Image is too large ({width}x{height} pixels).", status_code=413)
+
+    scale = target_size / min(width, height)
+    orientation = image.getexif().get(0x0112, 1) # EXIF Orientation tag
+    if scale >= 1 and orientation == 1 and image.mode == "RGB" and image.format in ("JPEG", "PNG"):
+        return data
+
+    try:
+        if scale < 1 and image.format == "JPEG":
+            image.draft("RGB", (target_size, target_size)) # Decode at 1/2, 1/4 or 1/8 scale where possible
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        scale = target_size / min(image.size)
+        if scale < 1:
+            image = image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.BICUBIC)
+    except Image.DecompressionBombError as e:
+        raise ImageIngestError(str(e), status_code=413) from None
+    except OSError:
+        raise ImageIngestError("Could not decode the image.") from None
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=INGEST_JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+async def ingest_upload(upload) -> IngestedImage:
+    data, digest = await read_upload(upload)
+    return IngestedImage(digest=digest, original_size=len(data), raw=data)
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_multicast or ip.is_unspecified)
+
+
+async def resolve_public_addresses(host: str, port: int) -> list:
+    """
+    Resolves `host` and returns its addresses, or raises ImageIngestError unless all of them are public.
+    """
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ImageIngestError(f"Could not resolve host '{host}'.") from None
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not all(_is_public_address(address) for address in addresses):
+        raise ImageIngestError("Image URLs must point to a public address.")
+    return addresses
+
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend that resolves every host itself and only connects to public
+    addresses. The check and the connection use the same resolved address, so a DNS answer
+    that changes in between (DNS rebinding) can't point a fetch at an internal service.
+    TLS still verifies the certificate against the URL's hostname.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend | None = None):
+        self._backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await resolve_public_addresses(host, port)
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                       socket_options=socket_options)
+            except httpcore.ConnectError:
+                if address == addresses[-1]:
+                    raise
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise ImageIngestError("Image URLs must point to a public address.")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class ImageFetcher:
+    """
+    Fetches images from URLs with one pooled async HTTP client per process.
+
+    Responses are streamed with a size cap and timeouts, normalized like uploads, and kept in
+    an in-process cache keyed by URL so popular images are fetched and decoded once.
+    Unless `allow_private` is set, connections are only made to public addresses.
+    """
+
+    def __init__(self, max_bytes: int = MAX_UPLOAD_BYTES, allow_private: bool = FETCH_ALLOW_PRIVATE):
+        self.max_bytes = max_bytes
+        self.allow_private = allow_private
+        self.cache = LocalLRU(FETCH_CACHE_MAX_ENTRIES, FETCH_CACHE_TTL) if FETCH_CACHE_MAX_ENTRIES > 0 else None
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=FETCH_MAX_CONNECTIONS, max_keepalive_connections=FETCH_MAX_CONNECTIONS // 5)
+            transport = httpx.AsyncHTTPTransport(limits=limits)
+            if not self.allow_private:
+                # httpx has no option for the network backend, so swap it on the transport's pool
+                transport._pool._network_backend = PublicAddressBackend()
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(FETCH_TIMEOUT),
+                follow_redirects=False, # Redirects are followed manually so every hop is validated
+                trust_env=False, # A proxy would make the connection, bypassing the address check
+                headers={"User-Agent": "VisionaryAI/0.1 (+image fetch)"},
+            )
+        return self._client
+
+    def _check_url(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ImageIngestError("Only http and https image URLs are supported.")
+
+    async def _download(self, url: str, max_redirects: int = 5) -> bytes:
+        for _ in range(max_redirects + 1):
+            self._check_url(url) # The address is checked when the connection is made (PublicAddressBackend)
+            async with self.client.stream("GET", url) as response:
+                if response.is_redirect:
+                    url = str(response.url.join(response.headers["location"]))
+                    continue
+                if response.status_code != 200:
+                    raise ImageIngestError(f"Image URL returned HTTP {response.status_code}.", status_code=502)
+                content_type = response.headers.get("content-type", "")
+                if not content_type.startswith("image/"):
+                    raise ImageIngestError(f"URL does not point to an image (content type '{content_type}').")
+                content_length = response.headers.get("content-length", "")
+                if content_length.isdigit() and int(content_length) > self.max_bytes: # Malformed values fall back to the streaming cap
+                    raise ImageIngestError(f"Image exceeds the {self.max_bytes // (1024 * 1024)} MB size limit.", status_code=413)
+
+                buffer = bytearray()
+                async for chunk in response.aiter_bytes(READ_CHUNK_SIZE):
+                    buffer.extend(chunk)
+                    if len(buffer) > self.max_bytes:
+                        raise ImageIngestError(f"Image exceeds the {self.max_bytes // (1024 * 1024)} MB size limit.", status_code=413)
+                return bytes(buffer)
+        raise ImageIngestError("Image URL redirected too many times.", status_code=502)
+
+    async def fetch(self, url: str) -> IngestedImage:
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached
+
+        try:
+            data = await self._download(url)
+        except httpx.TimeoutException:
+            raise ImageIngestError("Timed out fetching the image URL.", status_code=504) from None
+        except httpx.HTTPError as e:
+            raise ImageIngestError(f"Could not fetch the image URL: {e}", status_code=502) from None
+
+        image = IngestedImage(digest=hashlib.sha256(data).digest(), original_size=len(data), raw=data)
+        await image.prepare() # Cache the small normalized copy rather than the original bytes
+        if self.cache is not None:
+            self.cache.set(url, image)
+        return image
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_image_fetcher = None
+
+
+def get_image_fetcher() -> ImageFetcher:
+    global _image_fetcher
+    if _image_fetcher is None:
+        _image_fetcher = ImageFetcher()
+    return _image_fetcher
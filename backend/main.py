@@ -1,14 +1,33 @@
 # backend/main.py
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import io
+import json
+import scipy.io.wavfile as wavfile
 import os
+import time
 from dotenv import load_dotenv
-from celery_worker import debug_task, generate_caption, answer_question_on_image, generate_speech 
+from celery_worker import debug_task, generate_caption, answer_question_on_image, generate_speech, answer_questions_on_image, caption_images, task_operation
+from celery import chain
+from celery.utils import uuid
+from ai_models.core import CAPTION_MODEL_ID, VQA_MODEL_ID
+from cache import get_result_cache, make_cache_key, normalize_text, CACHED_TASK_PREFIX
+from blob_store import get_blob_store
+from ingest import ImageIngestError, IngestedImage, RequestSizeLimitMiddleware, ingest_upload, get_image_fetcher
+from ai_models.speech import AUDIO_MEDIA_TYPES, STREAMABLE_FORMATS, streaming_wav_header, speech_cache_key
+from events import TaskEventSubscription, get_task_event_hub, make_event, TERMINAL_STATES, TASK_EVENTS_KEEPALIVE
+from metrics import REQUEST_SECONDS, TRACE_HEADER, clean_trace_id, set_trace_id, reset_trace_id, stage_timer, render_metrics
 import logging
-import base64
 
 load_dotenv() # Load environment variables from .env file
 
+# Maximum number of questions or images accepted by one batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "64"))
+SPEECH_STREAM_START_TIMEOUT = float(os.getenv("SPEECH_STREAM_START_TIMEOUT", "300"))  # seconds to wait for the first audio
+
 app = FastAPI(
     title="VisionaryAI Backend",
     description="API for image captioning, VQA, and text-to-speech.",
@@ -26,6 +45,31 @@ origins = [
     # Add other origins if frontend runs on a different port/domain
 ]
 
+@app.exception_handler(ImageIngestError)
+async def image_ingest_error_handler(request: Request, exc: ImageIngestError):
+    logger.warning(f"Rejected image: {exc}")
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Gives every request a trace id (the client's X-Trace-Id, or a new one) that is passed on to
+    the Celery tasks it queues and echoed in the response, and records the request latency.
+    """
+    trace_id = clean_trace_id(request.headers.get(TRACE_HEADER))
+    token = set_trace_id(trace_id)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        reset_trace_id(token)
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched" # Route templates keep label cardinality low
+    REQUEST_SECONDS.labels(method=request.method, endpoint=endpoint, status=response.status_code).observe(time.perf_counter() - start)
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
+app.add_middleware(RequestSizeLimitMiddleware) # Caps bodies at MAX_REQUEST_BYTES
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -34,6 +78,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def cached_response(cache_key: str, label: str):
+    """
+    Returns an immediate response if the result for `cache_key` is already cached, else None.
+    The synthetic task id keeps polling clients working: /task_status resolves it from the cache.
+    """
+    result_cache = get_result_cache()
+    if result_cache is None:
+        return None
+    # The Redis client is synchronous; keep its round trips off the event loop that serves the streams
+    cached = await run_in_threadpool(result_cache.get, cache_key)
+    if cached is None:
+        return None
+    logger.info(f"{label} served from cache (key {cache_key[:12]}...)")
+    return {
+        "task_id": f"{CACHED_TASK_PREFIX}{cache_key}",
+        "status": "SUCCESS",
+        "result": cached,
+        "cached": True,
+        "message": f"{label} result served from cache.",
+    }
+
+async def cached_batch_response(item_keys: list, result: dict, label: str, message: str):
+    """
+    Response for a batch request whose items were all cached. The combined result is cached
+    under a key derived from the item keys, so its cached- task id resolves like single hits.
+    """
+    batch_key = make_cache_key(f"{label}#batch", text="\n".join(item_keys))
+    await run_in_threadpool(get_result_cache().set, batch_key, result)
+    logger.info(f"{label} batch served from cache (key {batch_key[:12]}...)")
+    return {"task_id": f"{CACHED_TASK_PREFIX}{batch_key}", "status": "SUCCESS", "result": result, "cached": True, "message": message}
+
+async def dispatch_task(task, args: list, cache_key: str, label: str, image: IngestedImage | None = None, kwargs: dict | None = None):
+    """
+    Queues `task` unless an identical request is already running, in which case the
+    caller is attached to that task's id instead of running inference again.
+
+    `image` is only normalized and written to the blob store once we know the task will be
+    queued; the blob key is passed to the task as its first argument.
+    """
+    if image is not None:
+        args = [None, *args] # Placeholder for the blob key
+    kwargs = dict(kwargs or {})
+    operation = task_operation(task.name)
+
+    result_cache = get_result_cache()
+    if result_cache is None:
+        if image is not None:
+            args[0] = await store_image(image, operation)
+        with stage_timer(operation, "enqueue"):
+            task_result = await run_in_threadpool(task.apply_async, args=args, kwargs=kwargs)
+        logger.info(f"{label} task initiated with ID: {task_result.id}")
+        return {"task_id": task_result.id, "message": f"{label} task initiated."}
+
+    task_id, claimed = await run_in_threadpool(result_cache.claim_inflight, cache_key, uuid())
+    if not claimed:
+        logger.info(f"{label} request attached to in-flight task {task_id}")
+        return {"task_id": task_id, "message": f"Attached to in-flight {label} task."}
+
+    try:
+        if image is not None:
+            args[0] = await store_image(image, operation)
+        with stage_timer(operation, "enqueue"):
+            await run_in_threadpool(task.apply_async, args=args, kwargs={**kwargs, "cache_key": cache_key}, task_id=task_id)
+    except Exception:
+        # Don't leave later requests waiting on a task that was never queued
+        await run_in_threadpool(result_cache.release_inflight, cache_key, task_id=task_id)
+        if image is not None and args[0] is not None:
+            await run_in_threadpool(get_blob_store().delete, args[0])
+        raise
+    logger.info(f"{label} task initiated with ID: {task_id}")
+    return {"task_id": task_id, "message": f"{label} task initiated."}
+
+async def read_image(upload: UploadFile, operation: str) -> IngestedImage:
+    with stage_timer(operation, "upload_read"):
+        return await ingest_upload(upload)
+
+async def fetch_image(url: str, operation: str) -> IngestedImage:
+    with stage_timer(operation, "fetch"):
+        return await get_image_fetcher().fetch(url)
+
+async def store_image(image: IngestedImage, operation: str) -> str:
+    """
+    Normalizes an accepted image and writes it to the blob store. Returns the blob key.
+    """
+    with stage_timer(operation, "encode"):
+        data = await image.prepare()
+    with stage_timer(operation, "blob_store"):
+        return await run_in_threadpool(get_blob_store().put, data)
+
+def validate_audio_format(audio_format: str):
+    if audio_format not in AUDIO_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported audio format. Choose from: {', '.join(AUDIO_MEDIA_TYPES)}.")
+
+def validate_image_upload(upload: UploadFile):
+    if not upload.content_type or not upload.content_type.startswith("image/"):
+        logger.error(f"Received non-image file: {upload.content_type}")
+        raise HTTPException(status_code=400, detail="Only image files are allowed.")
+
+def validate_batch_size(count: int):
+    if count > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items are allowed per batch request.")
+
+@app.on_event("shutdown")
+async def stop_task_event_hub():
+    await get_task_event_hub().stop()
+
+@app.on_event("shutdown")
+async def close_image_fetcher():
+    await get_image_fetcher().aclose()
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to VisionaryAI Backend!"}
@@ -48,12 +202,21 @@ async def env_test():
     test_var = os.getenv("TEST_ENV_VAR", "Not Set")
     return {"test_variable": test_var}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: request latency and per-stage timings (upload read, encode, enqueue, ...).
+    Workers export their own stages (queue wait, decode, forward, ...) on WORKER_METRICS_PORT.
+    """
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
 @app.get("/test_celery")
 async def test_celery_task():
     """
     Sends a simple debug task to the Celery worker.
     """
-    task = debug_task.delay("This is a test message from FastAPI.")
+    task = await run_in_threadpool(debug_task.delay, "This is a test message from FastAPI.")
     return {"task_id": task.id, "message": "Celery task sent successfully."}
 
 @app.get("/task_status/{task_id}")
@@ -61,50 +224,402 @@ async def get_task_status(task_id: str):
     """
     Retrieves the status and result of a Celery task by ID.
     """
+    status = await run_in_threadpool(task_status_snapshot, task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Cached result has expired; please resubmit the request.")
+    return status
+
+def task_status_snapshot(task_id: str):
+    """
+    Returns the current status of a task (None for an expired cached- id). Blocking.
+    """
+    if task_id.startswith(CACHED_TASK_PREFIX):
+        result_cache = get_result_cache()
+        cached = result_cache.peek(task_id[len(CACHED_TASK_PREFIX):]) if result_cache is not None else None
+        return make_event(task_id, "SUCCESS", cached) if cached is not None else None
+
     task_result = debug_task.AsyncResult(task_id)
-    return {
-        "task_id": task_id,
-        "status": task_result.status,
-        "result": task_result.result if task_result.ready() else None
-    }
+    result = task_result.result if task_result.ready() or task_result.status == "PROGRESS" else None
+    if isinstance(result, Exception):
+        result = {"exc_type": type(result).__name__, "exc_message": str(result)}
+    return make_event(task_id, task_result.status, result)
+
+async def task_event_snapshot(task_id: str) -> dict:
+    status = await run_in_threadpool(task_status_snapshot, task_id)
+    if status is None:
+        return make_event(task_id, "FAILURE", {"exc_type": "CacheExpired", "exc_message": "Cached result has expired; please resubmit the request."})
+    return status
+
+def parse_task_ids(task_ids: str) -> list:
+    ids = [task_id.strip() for task_id in task_ids.split(",") if task_id.strip()]
+    if not ids:
+        raise HTTPException(status_code=400, detail="At least one task id is required.")
+    return ids
+
+@app.get("/task_events")
+async def task_events(task_ids: str):
+    """
+    Server-Sent Events stream of state changes (STARTED, PROGRESS, SUCCESS/FAILURE with the result)
+    for one or more comma-separated task ids. Each event's data has the same shape as /task_status;
+    a final `done` event is sent once every task has finished.
+    """
+    ids = parse_task_ids(task_ids)
+
+    async def stream():
+        subscription = TaskEventSubscription(task_event_snapshot)
+        try:
+            await subscription.add(ids)
+            while subscription.pending:
+                event = await subscription.next_event(TASK_EVENTS_KEEPALIVE)
+                if event is None:
+                    yield ": keepalive\n\n" # Stops proxies from closing an idle connection
+                    continue
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/tasks")
+async def task_events_websocket(websocket: WebSocket):
+    """
+    WebSocket channel for task state changes. Clients send {"subscribe": ["<task_id>", ...]}
+    at any time and receive one JSON message per event, shaped like /task_status responses.
+    """
+    await websocket.accept()
+    subscription = TaskEventSubscription(task_event_snapshot)
+
+    async def receive_subscriptions():
+        while True:
+            message = await websocket.receive_json()
+            await subscription.add([str(task_id) for task_id in message.get("subscribe", [])])
+
+    receiver = asyncio.create_task(receive_subscriptions())
+    try:
+        while True:
+            next_event = asyncio.create_task(subscription.next_event(TASK_EVENTS_KEEPALIVE))
+            done, _ = await asyncio.wait({receiver, next_event}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                next_event.cancel()
+                break
+            event = next_event.result()
+            if event is not None:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        subscription.close()
+        try:
+            await receiver
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception as e:
+            logger.warning(f"Task event WebSocket closed: {e}")
+
+@app.get("/task_status/{task_id}/wait")
+async def wait_for_task_status(task_id: str, timeout: float = 25.0):
+    """
+    Long-poll fallback: returns as soon as the task finishes, or its current status after
+    `timeout` seconds (max 60), for clients that can't hold an SSE or WebSocket connection.
+    """
+    subscription = TaskEventSubscription(task_event_snapshot)
+    try:
+        await subscription.add([task_id])
+        deadline = asyncio.get_running_loop().time() + min(max(timeout, 0.0), 60.0)
+        while subscription.pending:
+            remaining = deadline - asyncio.get_running_loop().time()
+            event = await subscription.next_event(remaining) if remaining > 0 else None
+            if event is None:
+                break
+            if event["status"] in TERMINAL_STATES:
+                return event
+    finally:
+        subscription.close()
+    return await get_task_status(task_id)
 
 @app.post("/caption_image")
 async def caption_image(image: UploadFile = File(...)):
     """
     Receives an image, sends it to Celery for captioning, and returns the task ID.
     """
-    if not image.content_type.startswith("image/"):
-        logger.error(f"Received non-image file: {image.content_type}")
-        raise HTTPException(status_code=400, detail="Only image files are allowed.")
+    validate_image_upload(image)
+    return await submit_caption(await read_image(image, "caption"))
 
-    image_bytes = await image.read()
-    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+@app.post("/caption_image_url")
+async def caption_image_url(image_url: str = Form(...)):
+    """
+    Fetches an image from a URL, sends it to Celery for captioning, and returns the task ID.
+    """
+    return await submit_caption(await fetch_image(image_url, "caption"))
 
-    task = generate_caption.delay(image_base64)
-    logger.info(f"Image captioning task initiated with ID: {task.id}")
-    return {"task_id": task.id, "message": "Image captioning task initiated."}
+async def submit_caption(image: IngestedImage):
+    cache_key = make_cache_key(CAPTION_MODEL_ID, image_digest=image.digest)
+    cached = await cached_response(cache_key, "Image captioning")
+    if cached is not None:
+        return cached
+
+    return await dispatch_task(generate_caption, [], cache_key, "Image captioning", image=image)
 
 @app.post("/answer_question")
 async def answer_question(file: UploadFile = File(...), question: str = Form(...)):
     """
     Receives an image and a question, sends them to Celery for VQA, and returns the task ID.
     """
-    if not file.content_type.startswith("image/"):
-        logger.error(f"Received non-image file: {file.content_type}")
-        raise HTTPException(status_code=400, detail="Only image files are allowed.")
+    validate_image_upload(file)
+    return await submit_question(await read_image(file, "vqa"), question)
+
+@app.post("/answer_question_url")
+async def answer_question_url(image_url: str = Form(...), question: str = Form(...)):
+    """
+    Fetches an image from a URL, sends it with the question to Celery for VQA, and returns the task ID.
+    """
+    return await submit_question(await fetch_image(image_url, "vqa"), question)
 
-    image_bytes = await file.read()
-    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+async def submit_question(image: IngestedImage, question: str):
+    # ViLT's tokenizer is uncased, so case and spacing differences don't change the answer
+    cache_key = make_cache_key(VQA_MODEL_ID, image_digest=image.digest, text=normalize_text(question, lowercase=True))
+    cached = await cached_response(cache_key, "VQA")
+    if cached is not None:
+        return cached
 
-    task = answer_question_on_image.delay(image_base64, question)
-    logger.info(f"VQA task initiated with ID: {task.id}")
-    return {"task_id": task.id, "message": "VQA task initiated."}
+    return await dispatch_task(answer_question_on_image, [question], cache_key, "VQA", image=image)
 
 @app.post("/generate_speech")
-async def generate_speech_endpoint(text: str = Form(...)):
+async def generate_speech_endpoint(text: str = Form(...), format: str = Form("wav"), stream: bool = Form(False)):
     """
     Receives text, sends it to Celery for TTS, and returns the task ID.
+
+    `format` is wav (16-bit PCM), ogg (Vorbis) or flac. With `stream=true` the text is synthesized
+    sentence by sentence and each chunk is published as a PROGRESS event as soon as it is ready;
+    play them with /speech_stream/{task_id} or fetch the chunk audio_urls from /task_events.
+    """
+    validate_audio_format(format)
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text to synthesize is empty.")
+    cache_key = speech_cache_key(text, format)
+    cached = await cached_response(cache_key, "TTS")
+    if cached is not None:
+        return cached
+
+    return await dispatch_task(generate_speech, [text], cache_key, "TTS", kwargs={"audio_format": format, "stream": stream})
+
+@app.post("/answer_questions")
+async def answer_questions_endpoint(file: UploadFile = File(...), questions: list[str] = Form(...)):
+    """
+    Answers several questions about one image (e.g. a screen-reader session). The image is uploaded,
+    decoded and preprocessed once; answers stream back per batch as PROGRESS events.
+    Repeat the `questions` form field once per question.
+    """
+    validate_image_upload(file)
+    validate_batch_size(len(questions))
+
+    image = await read_image(file, "vqa")
+    result_cache = get_result_cache()
+    items = []
+    for index, question in enumerate(questions):
+        # Same keys as /answer_question, so single and batch requests share cached answers
+        cache_key = make_cache_key(VQA_MODEL_ID, image_digest=image.digest, text=normalize_text(question, lowercase=True))
+        cached = await run_in_threadpool(result_cache.get, cache_key) if result_cache is not None else None
+        items.append({"index": index, "question": question, "cache_key": cache_key, "answer": cached["answer"] if cached else None})
+
+    cached_count = sum(item["answer"] is not None for item in items)
+    if cached_count == len(items):
+        answers = [{"index": item["index"], "question": item["question"], "answer": item["answer"]} for item in items]
+        return await cached_batch_response([item["cache_key"] for item in items], {"answers": answers},
+                                           "Batch VQA", "All answers served from cache.")
+
+    image_key = await store_image(image, "vqa")
+    try:
+        with stage_timer("vqa", "enqueue"):
+            task = await run_in_threadpool(answer_questions_on_image.delay, image_key, items)
+    except Exception:
+        await run_in_threadpool(get_blob_store().delete, image_key)
+        raise
+    logger.info(f"Batch VQA task initiated with ID: {task.id} ({len(items)} questions, {cached_count} cached)")
+    return {"task_id": task.id, "total": len(items), "cached": cached_count, "message": "Batch VQA task initiated."}
+
+@app.post("/caption_images")
+async def caption_images_endpoint(images: list[UploadFile] = File(...)):
+    """
+    Captions many images in one job (e.g. bulk alt-text for a folder of assets). Images are
+    captioned in batches and captions stream back per batch as PROGRESS events.
+    """
+    for upload in images:
+        validate_image_upload(upload)
+    validate_batch_size(len(images))
+
+    result_cache = get_result_cache()
+    items = []
+    pending = [] # (item, image) pairs that still need a caption
+    for index, upload in enumerate(images):
+        image = await read_image(upload, "caption")
+        cache_key = make_cache_key(CAPTION_MODEL_ID, image_digest=image.digest) # Shared with /caption_image
+        cached = await run_in_threadpool(result_cache.get, cache_key) if result_cache is not None else None
+        item = {
+            "index": index,
+            "filename": upload.filename,
+            "cache_key": cache_key,
+            "caption": cached["caption"] if cached else None,
+            "image_key": None,
+        }
+        items.append(item)
+        if cached is None:
+            pending.append((item, image))
+
+    if not pending:
+        captions = [{"index": item["index"], "filename": item["filename"], "caption": item["caption"]} for item in items]
+        return await cached_batch_response([item["cache_key"] for item in items], {"captions": captions},
+                                           "Batch captioning", "All captions served from cache.")
+
+    # Every upload was accepted before anything is stored; if one still fails to normalize
+    # (or the task can't be queued), the blobs stored so far are removed again
+    cached_count = len(items) - len(pending)
+    try:
+        for item, image in pending:
+            item["image_key"] = await store_image(image, "caption")
+        with stage_timer("caption", "enqueue"):
+            task = await run_in_threadpool(caption_images.delay, items)
+    except Exception:
+        for item, _ in pending:
+            if item["image_key"] is not None:
+                await run_in_threadpool(get_blob_store().delete, item["image_key"])
+        raise
+    logger.info(f"Batch captioning task initiated with ID: {task.id} ({len(items)} images, {cached_count} cached)")
+    return {"task_id": task.id, "total": len(items), "cached": cached_count, "message": "Batch captioning task initiated."}
+
+@app.post("/describe_image")
+async def describe_image(file: UploadFile = File(...), format: str = Form("wav"), stream: bool = Form(False)):
+    """
+    Captions an image and speaks the caption as one server-side job (caption -> TTS chain).
+    `task_id` is the TTS step, whose result includes the caption `text`; `caption_task_id`
+    can be watched to show the caption before the audio is ready.
+    """
+    validate_image_upload(file)
+    validate_audio_format(format)
+
+    image = await read_image(file, "caption")
+    caption_key = make_cache_key(CAPTION_MODEL_ID, image_digest=image.digest)
+    result_cache = get_result_cache()
+    cached_caption = await run_in_threadpool(result_cache.get, caption_key) if result_cache is not None else None
+    speech_kwargs = {"audio_format": format, "stream": stream}
+
+    if cached_caption is not None:
+        # Only the TTS step is left; it may be cached or in flight as well
+        caption = cached_caption["caption"]
+        speech_key = speech_cache_key(caption, format)
+        response = await cached_response(speech_key, "Describe image") or await dispatch_task(generate_speech, [caption], speech_key, "Describe image", kwargs=speech_kwargs)
+        return {**response, "caption": caption}
+
+    image_key = await store_image(image, "caption")
+    with stage_timer("caption", "enqueue"):
+        workflow = await run_in_threadpool(chain(
+            generate_caption.s(image_key, cache_key=caption_key),
+            generate_speech.s(**speech_kwargs),
+        ).apply_async)
+    logger.info(f"Describe image job initiated with ID: {workflow.id} (caption task {workflow.parent.id})")
+    return {"task_id": workflow.id, "caption_task_id": workflow.parent.id, "message": "Describe image job initiated."}
+
+def _stream_chunk_bytes(chunk: dict) -> bytes:
+    """
+    Bytes to append to a /speech_stream response for one chunk: raw PCM frames for wav
+    (after the streaming header), or the complete chunk file for ogg (chained Ogg streams).
+    """
+    audio_bytes = get_blob_store().get(chunk["audio_key"])
+    if chunk["format"] == "wav":
+        return wavfile.read(io.BytesIO(audio_bytes))[1].tobytes()
+    return audio_bytes
+
+def _full_audio_stream_bytes(result: dict) -> bytes:
+    """
+    Bytes for a finished task that produced no chunks (non-streaming or cached result).
+    """
+    audio_bytes = get_blob_store().get(result["audio_key"])
+    if result["format"] == "wav":
+        return wavfile.read(io.BytesIO(audio_bytes))[1].tobytes() # PCM frames only, the header was already sent
+    return audio_bytes
+
+@app.get("/speech_stream/{task_id}")
+async def speech_stream(task_id: str):
+    """
+    Streams the audio of a TTS task as chunks are synthesized, so playback can start after the
+    first sentence. wav tasks stream as one open-ended 16-bit WAV; ogg tasks as chained Ogg streams.
+    """
+    subscription = TaskEventSubscription(task_event_snapshot)
+    await subscription.add([task_id])
+
+    # Wait for the first audio before sending headers, so the media type matches the task's format
+    first = None
+    deadline = asyncio.get_running_loop().time() + SPEECH_STREAM_START_TIMEOUT
+    while first is None and subscription.pending:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            subscription.close()
+            raise HTTPException(status_code=504, detail="Timed out waiting for the first audio chunk (unknown task id or long queue).")
+        event = await subscription.next_event(min(TASK_EVENTS_KEEPALIVE, remaining))
+        if event is None:
+            continue
+        if event["status"] in ("FAILURE", "REVOKED"):
+            subscription.close()
+            raise HTTPException(status_code=500, detail=f"Speech generation failed: {(event['result'] or {}).get('exc_message', event['status'])}")
+        result = event["result"] or {}
+        if result.get("chunks") or event["status"] == "SUCCESS":
+            first = event
+    if first is None:
+        raise HTTPException(status_code=404, detail="Task produced no audio.")
+
+    audio_format = (first["result"].get("chunks") or [first["result"]])[0]["format"]
+    if audio_format not in STREAMABLE_FORMATS:
+        subscription.close()
+        raise HTTPException(status_code=400, detail=f"{audio_format} audio can't be streamed; download it from the task's audio_url.")
+
+    async def stream():
+        sent = 0
+        event = first
+        try:
+            if audio_format == "wav":
+                sampling_rate = (first["result"].get("chunks") or [{}])[0].get("sampling_rate")
+                if sampling_rate is None: # Finished without chunks: read the rate from the complete file
+                    audio_bytes = await run_in_threadpool(get_blob_store().get, first["result"]["audio_key"])
+                    sampling_rate = wavfile.read(io.BytesIO(audio_bytes))[0]
+                yield streaming_wav_header(sampling_rate)
+            while event is not None or subscription.pending:
+                if event is not None and event["status"] in ("FAILURE", "REVOKED"):
+                    break
+                if event is not None and event["result"]:
+                    chunks = event["result"].get("chunks") or []
+                    for chunk in chunks[sent:]:
+                        yield await run_in_threadpool(_stream_chunk_bytes, chunk)
+                    sent = max(sent, len(chunks))
+                    if event["status"] == "SUCCESS":
+                        if sent == 0:
+                            yield await run_in_threadpool(_full_audio_stream_bytes, event["result"])
+                        break
+                event = await subscription.next_event(TASK_EVENTS_KEEPALIVE) if subscription.pending else None
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type=AUDIO_MEDIA_TYPES[audio_format], headers={"Cache-Control": "no-cache"})
+
+@app.get("/blobs/{key}")
+async def get_blob(key: str, format: str | None = None):
+    """
+    Serves a stored binary payload (e.g. generated speech) as raw bytes.
+    """
+    try:
+        data = await run_in_threadpool(get_blob_store().get, key)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Blob not found or expired.")
+    return Response(content=data, media_type=AUDIO_MEDIA_TYPES.get(format, "application/octet-stream"))
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """
+    Returns result cache hit/miss/eviction counters, for sizing the cache.
     """
-    task = generate_speech.delay(text)
-    logger.info(f"TTS task initiated with ID: {task.id}")
-    return {"task_id": task.id, "message": "TTS task initiated."}
\ No newline at end of file
+    result_cache = get_result_cache()
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **(await run_in_threadpool(result_cache.stats))}
\ No newline at end of file
@@ -0,0 +1,136 @@
+# backend/metrics.py
+import functools
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Histogram, generate_latest, multiprocess, start_http_server
+
+load_dotenv() # Load environment variables
+
+logger = logging.getLogger(__name__)
+
+# Metrics settings (see setup.md for details)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9540"))  # 0 disables the worker's metrics server
+# Set by prometheus_client itself; when present, metrics from every process are aggregated
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+TRACE_HEADER = "X-Trace-Id"
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# 1 ms to 2 min: stages range from cache lookups to a full MusicGen generation
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# `operation` is the model a request is for (caption, vqa, tts: the same names as the Celery queues)
+STAGE_SECONDS = Histogram(
+    "visionaryai_stage_seconds", "Time spent in one stage of a request.",
+    ["operation", "stage"], buckets=DURATION_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "visionaryai_request_seconds", "API request latency, until the response headers are sent.",
+    ["method", "endpoint", "status"], buckets=DURATION_BUCKETS,
+)
+TASK_SECONDS = Histogram(
+    "visionaryai_task_seconds", "Celery task run time, excluding queue wait.",
+    ["task", "state"], buckets=DURATION_BUCKETS,
+)
+
+# Trace id of the request being handled. Set by the API middleware, carried to Celery in a
+# message header and restored in the worker, so API and worker logs can be correlated.
+_trace_id = ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def clean_trace_id(trace_id: str | None) -> str:
+    """
+    Returns `trace_id` if it is a sane client-supplied id, otherwise a new one.
+    """
+    return trace_id if trace_id and _VALID_TRACE_ID.match(trace_id) else new_trace_id()
+
+
+def get_trace_id() -> str | None:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: str | None):
+    """
+    Sets the current trace id and returns a token for `reset_trace_id`.
+    """
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+
+def observe_stage(operation: str, stage: str, seconds: float):
+    STAGE_SECONDS.labels(operation=operation, stage=stage).observe(seconds)
+    logger.debug(f"[trace {get_trace_id()}] {operation} {stage}: {seconds * 1000:.1f} ms")
+
+
+@contextmanager
+def stage_timer(operation: str, stage: str):
+    """
+    Times the enclosed block as one stage of `operation`. Also works around `await`s.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(operation, stage, time.perf_counter() - start)
+
+
+def timed_stage(operation: str, stage: str):
+    """
+    Decorator form of `stage_timer`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(operation, stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_pipeline(pipe, operation: str):
+    """
+    Times the preprocess, forward and postprocess steps of a transformers pipeline. The methods are
+    wrapped on the instance, so batched calls (which run through a DataLoader) are timed as well.
+    """
+    for method, stage in (("preprocess", "preprocess"), ("_forward", "forward"), ("postprocess", "postprocess")):
+        setattr(pipe, method, timed_stage(operation, stage)(getattr(pipe, method)))
+    return pipe
+
+
+def _collector_registry():
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Returns (body, content type) in the Prometheus text exposition format.
+    """
+    return generate_latest(_collector_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int = WORKER_METRICS_PORT):
+    """
+    Serves /metrics on `port` from a background thread (used by Celery workers).
+    """
+    if not port:
+        return
+    start_http_server(port, registry=_collector_registry())
+    logger.info(f"Serving metrics on port {port}")
@@ -0,0 +1,115 @@
+# backend/tests/test_api.py
+"""
+Tests for the FastAPI app, with fakeredis behind the result cache and blob store and Celery's
+in-memory broker (no worker runs, so queued tasks stay queued).
+"""
+import io
+import os
+
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+import fakeredis
+import httpx
+import pytest
+from PIL import Image
+
+import blob_store
+import cache
+from ai_models.core import CAPTION_MODEL_ID, VQA_MODEL_ID
+from blob_store import RedisBlobStore
+from cache import ResultCache, make_cache_key, normalize_text
+from main import app
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    server = fakeredis.FakeServer()
+    result_cache = ResultCache(fakeredis.FakeRedis(server=server), local_max_entries=0)
+    blobs = RedisBlobStore(fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache, "_result_cache", result_cache)
+    monkeypatch.setattr(blob_store, "_blob_store", blobs)
+    return result_cache, blobs
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def jpeg_bytes(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def blob_count(blobs) -> int:
+    return len(blobs.redis.keys("visionaryai:blob:*"))
+
+
+async def test_caption_images_all_cached_has_resolvable_task_id(client, stores):
+    result_cache, _ = stores
+    images = [jpeg_bytes((255, 0, 0)), jpeg_bytes((0, 0, 255))]
+    for data, caption in zip(images, ["red", "blue"]):
+        result_cache.set(make_cache_key(CAPTION_MODEL_ID, image_bytes=data), {"caption": caption})
+
+    response = (await client.post("/caption_images", files=[("images", (f"{i}.jpg", data, "image/jpeg"))
+                                                             for i, data in enumerate(images)])).json()
+    assert response["task_id"].startswith("cached-")
+    status = (await client.get(f"/task_status/{response['task_id']}")).json()
+    assert status["status"] == "SUCCESS"
+    assert [item["caption"] for item in status["result"]["captions"]] == ["red", "blue"]
+
+
+async def test_answer_questions_all_cached_has_resolvable_task_id(client, stores):
+    result_cache, _ = stores
+    image = jpeg_bytes((0, 255, 0))
+    for question, answer in [("What color?", "green"), ("Is it dark?", "no")]:
+        key = make_cache_key(VQA_MODEL_ID, image_bytes=image, text=normalize_text(question, lowercase=True))
+        result_cache.set(key, {"answer": answer})
+
+    response = (await client.post("/answer_questions", files={"file": ("a.jpg", image, "image/jpeg")},
+                                  data={"questions": ["What color?", "Is it dark?"]})).json()
+    status = (await client.get(f"/task_status/{response['task_id']}")).json()
+    assert status["status"] == "SUCCESS"
+    assert [item["answer"] for item in status["result"]["answers"]] == ["green", "no"]
+
+
+async def test_caption_images_stores_nothing_if_an_image_is_rejected(client, stores):
+    _, blobs = stores
+    files = [
+        ("images", ("good.jpg", jpeg_bytes((255, 0, 0)), "image/jpeg")),
+        ("images", ("broken.jpg", b"not really a jpeg", "image/jpeg")),
+    ]
+    response = await client.post("/caption_images", files=files)
+    assert response.status_code == 400
+    assert blob_count(blobs) == 0
+
+
+async def test_chunked_upload_over_request_limit_gets_413(client, stores, monkeypatch):
+    import ingest
+    monkeypatch.setattr(ingest, "MAX_REQUEST_BYTES", 1024 * 1024)
+    _, blobs = stores
+    boundary = "visionaryai-test-boundary"
+
+    async def body():
+        # No Content-Length: httpx sends this with Transfer-Encoding: chunked
+        yield (f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"big.jpg\"\r\n"
+               "Content-Type: image/jpeg\r\n\r\n").encode()
+        for _ in range(48):
+            yield b"\0" * 64 * 1024 # 3 MB in total
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = await client.post("/caption_image", content=body(),
+                                 headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body is too large."}
+    assert blob_count(blobs) == 0
@@ -0,0 +1,83 @@
+# backend/tests/test_batching.py
+"""
+Tests for MicroBatcher: batching, result fan-out, per-item retries and fork safety.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_models.batching import MicroBatcher
+
+
+def test_results_fan_out_in_order():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=50)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(batcher, range(8)))
+
+    assert results == [item * 2 for item in range(8)]
+    assert all(len(batch) <= 4 for batch in batches)
+    assert len(batches) < 8 # Concurrent callers shared forward passes
+
+
+def test_failed_batch_is_retried_item_by_item():
+    calls = []
+
+    def reject_negative(items):
+        calls.append(list(items))
+        if any(item < 0 for item in items):
+            raise ValueError("negative input")
+        return [item + 1 for item in items]
+
+    batcher = MicroBatcher(reject_negative, max_batch_size=3, max_wait_ms=200)
+    futures = [batcher.submit(item) for item in (1, -1, 2)]
+
+    assert futures[0].result(timeout=5) == 2
+    assert futures[2].result(timeout=5) == 3
+    with pytest.raises(ValueError, match="negative"):
+        futures[1].result(timeout=5)
+    assert calls[0] == [1, -1, 2]
+    assert calls[1:] == [[1], [-1], [2]]
+
+
+def test_wrong_result_count_fails_the_caller():
+    batcher = MicroBatcher(lambda items: [], max_batch_size=1)
+    with pytest.raises(RuntimeError, match="0 results for 1 inputs"):
+        batcher("x")
+
+
+def test_thread_starts_on_first_submit():
+    batcher = MicroBatcher(lambda items: items)
+    assert batcher._thread is None
+    assert batcher("x") == "x"
+    assert batcher._thread.is_alive()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_gets_its_own_thread():
+    batcher = MicroBatcher(lambda items: [item.upper() for item in items])
+    assert batcher("parent") == "PARENT" # The parent's thread exists before the fork
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # Without the reset the child would queue work for a thread that doesn't exist in it
+            result = {}
+            worker = threading.Thread(target=lambda: result.setdefault("value", batcher("child")))
+            worker.start()
+            worker.join(timeout=5)
+            os.write(write_end, result.get("value", "hung").encode())
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    output = os.read(read_end, 64).decode()
+    os.waitpid(pid, 0)
+    assert output == "CHILD"
@@ -0,0 +1,141 @@
+# backend/tests/test_cache.py
+"""
+Tests for the Redis result cache against an in-process fakeredis server.
+"""
+import time
+
+import fakeredis
+import pytest
+
+import cache
+from blob_store import RedisBlobStore
+from cache import ResultCache
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def blob_store(server, monkeypatch):
+    store = RedisBlobStore(fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache, "get_blob_store", lambda: store)
+    return store
+
+
+def make_cache(server, **kwargs) -> ResultCache:
+    """
+    A cache as one process sees it; caches made from the same server share Redis, like the API and workers.
+    """
+    return ResultCache(fakeredis.FakeRedis(server=server), **{"local_max_entries": 0, **kwargs})
+
+
+def test_get_and_peek_counters(server):
+    result_cache = make_cache(server)
+    assert result_cache.get("a") is None
+    assert result_cache.peek("a") is None
+    result_cache.set("a", {"caption": "a dog"})
+    assert result_cache.get("a") == {"caption": "a dog"}
+    assert result_cache.peek("a") == {"caption": "a dog"}
+
+    stats = result_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_lru_eviction(server):
+    result_cache = make_cache(server, max_entries=2)
+    result_cache.set("a", {"n": 1})
+    result_cache.set("b", {"n": 2})
+    result_cache.get("a") # "b" is now the least recently used
+    result_cache.set("c", {"n": 3})
+
+    assert result_cache.peek("b") is None
+    assert result_cache.peek("a") == {"n": 1}
+    assert result_cache.peek("c") == {"n": 3}
+    assert result_cache.stats()["evictions"] == 1
+
+
+def test_local_hits_refresh_redis_lru(server):
+    result_cache = make_cache(server, max_entries=2, local_max_entries=8)
+    result_cache.set("a", {"n": 1})
+    result_cache.set("b", {"n": 2})
+    assert result_cache.get("a") == {"n": 1} # Served from the local tier
+
+    make_cache(server, max_entries=2).set("c", {"n": 3}) # Another process fills the cache
+
+    assert result_cache.stats()["local_hits"] == 1
+    assert make_cache(server).peek("a") == {"n": 1}
+    assert make_cache(server).peek("b") is None
+
+
+def test_expired_entries_dont_count_towards_size(server):
+    result_cache = make_cache(server, max_entries=2)
+    result_cache.set("a", {"n": 1})
+    # Simulate Redis expiring "a" while it is still the most recently used key in the index
+    result_cache.redis.delete(result_cache._value_key("a"))
+    result_cache.redis.zadd(result_cache._expiry_key, {"a": 0})
+    result_cache.redis.zadd(result_cache._index_key, {"a": 2**40})
+    result_cache.set("b", {"n": 2})
+    result_cache.set("c", {"n": 3})
+
+    stats = result_cache.stats()
+    assert (stats["size"], stats["evictions"]) == (2, 0)
+    assert result_cache.peek("b") == {"n": 2}
+    assert result_cache.peek("c") == {"n": 3}
+
+
+def test_eviction_deletes_referenced_blobs(server, blob_store):
+    result_cache = make_cache(server, max_entries=1, local_max_entries=8)
+    audio_key = blob_store.put(b"audio")
+    result_cache.set("a", {"audio_key": audio_key})
+    result_cache.set("b", {"caption": "no blobs"})
+
+    with pytest.raises(KeyError):
+        blob_store.get(audio_key)
+    assert result_cache.peek("a") is None # Dropped from the local tier too
+
+
+def test_inflight_ownership(server):
+    api, other_api = make_cache(server), make_cache(server)
+    assert api.claim_inflight("k", "task-1") == ("task-1", True)
+    assert other_api.claim_inflight("k", "task-2") == ("task-1", False)
+
+    api.release_inflight("k", task_id="task-2") # Not the owner: no effect
+    assert other_api.claim_inflight("k", "task-3") == ("task-1", False)
+
+    api.release_inflight("k", task_id="task-1")
+    assert other_api.claim_inflight("k", "task-4") == ("task-4", True)
+    assert api.stats()["inflight_joins"] == 2
+
+
+def test_redis_errors_are_misses():
+    server = fakeredis.FakeServer()
+    server.connected = False # Every command raises ConnectionError
+    result_cache = make_cache(server)
+    assert result_cache.get("a") is None
+    result_cache.set("a", {"n": 1}) # Logged, not raised
+    assert result_cache.claim_inflight("a", "task-1") == ("task-1", True)
+
+
+def test_results_with_blobs_stay_out_of_the_local_tier(server, blob_store):
+    api = make_cache(server, max_entries=1, local_max_entries=8)
+    worker = make_cache(server, max_entries=1, local_max_entries=8)
+    audio_key = blob_store.put(b"audio")
+    worker.set("a", {"audio_key": audio_key})
+    assert api.get("a") == {"audio_key": audio_key}
+
+    worker.set("b", {"audio_key": blob_store.put(b"more audio")}) # Evicts "a" and deletes its audio
+    assert api.get("a") is None # The API never kept a local copy that would outlive the blob
+
+
+def test_local_copy_expires_with_redis_value(server):
+    result_cache = make_cache(server, ttl=60)
+    result_cache.set("a", {"caption": "a dog"})
+    result_cache.redis.pexpire(result_cache._value_key("a"), 500)
+
+    api = make_cache(server, local_max_entries=8)
+    assert api.get("a") == {"caption": "a dog"}
+    expires_at, _ = api.local._entries["a"]
+    assert expires_at - time.monotonic() <= 0.5
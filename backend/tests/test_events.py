@@ -0,0 +1,108 @@
+# backend/tests/test_events.py
+"""
+Tests for TaskEventSubscription: events are delivered once, and lost events are recovered
+from the task state snapshot.
+"""
+import asyncio
+
+import pytest
+
+from events import RESYNC, TaskEventHub, TaskEventSubscription, make_event
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeHub(TaskEventHub):
+    """
+    A hub without a Redis reader; tests deliver events by putting them on the queues.
+    """
+
+    def _ensure_started(self):
+        pass
+
+    def publish(self, event: dict):
+        for queue in list(self._listeners.get(event["task_id"], ())):
+            queue.put_nowait(event)
+
+
+class Snapshots:
+    def __init__(self, **states):
+        self.states = states
+        self.reads = 0
+
+    async def __call__(self, task_id: str) -> dict:
+        self.reads += 1
+        return self.states.get(task_id, make_event(task_id, "PENDING"))
+
+
+async def test_published_events_are_delivered_once():
+    hub, snapshots = FakeHub(), Snapshots()
+    subscription = TaskEventSubscription(snapshots, hub=hub)
+    await subscription.add(["t1"])
+
+    progress = make_event("t1", "PROGRESS", {"stage": "inference"})
+    hub.publish(progress)
+    snapshots.states["t1"] = progress # The snapshot of the same state is not delivered again
+    assert await subscription.next_event(1) == progress
+    assert await subscription.next_event(0.05) is None
+
+    hub.publish(make_event("t1", "SUCCESS", {"caption": "a dog"}))
+    assert (await subscription.next_event(1))["status"] == "SUCCESS"
+    assert subscription.pending == set()
+    assert hub._listeners == {}
+
+
+async def test_lost_event_is_recovered_on_timeout():
+    snapshots = Snapshots()
+    subscription = TaskEventSubscription(snapshots, hub=FakeHub())
+    await subscription.add(["t1"])
+
+    # The worker finished but its SUCCESS event was never published
+    snapshots.states["t1"] = make_event("t1", "SUCCESS", {"caption": "a dog"})
+    event = await subscription.next_event(0.05)
+    assert event == snapshots.states["t1"]
+    assert subscription.pending == set()
+
+
+async def test_resync_rereads_state():
+    hub, snapshots = FakeHub(), Snapshots()
+    subscription = TaskEventSubscription(snapshots, hub=hub)
+    await subscription.add(["t1", "t2"])
+
+    snapshots.states["t2"] = make_event("t2", "FAILURE", {"exc_type": "ValueError"})
+    hub._resync() # What the reader does after it (re)subscribes
+    assert await subscription.next_event(1) == snapshots.states["t2"]
+    assert subscription.pending == {"t1"}
+
+
+async def test_finished_tasks_are_reported_on_subscribe():
+    done = make_event("t1", "SUCCESS", {"answer": "yes"})
+    subscription = TaskEventSubscription(Snapshots(t1=done), hub=FakeHub())
+    await subscription.add(["t1"])
+    assert await subscription.next_event(1) == done
+
+
+async def test_snapshot_errors_keep_the_stream_open():
+    async def failing_snapshot(task_id):
+        raise ConnectionError("backend down")
+
+    subscription = TaskEventSubscription(failing_snapshot, hub=FakeHub())
+    await subscription.add(["t1"])
+    assert await subscription.next_event(0.05) is None
+    assert subscription.pending == {"t1"}
+
+
+async def test_resync_marker_reaches_every_listener():
+    hub = FakeHub()
+    first, second = asyncio.Queue(), asyncio.Queue()
+    hub.register("t1", first)
+    hub.register("t2", first)
+    hub.register("t2", second)
+    hub._resync()
+    assert first.qsize() == 1 and first.get_nowait() is RESYNC
+    assert second.get_nowait() is RESYNC
@@ -0,0 +1,344 @@
+# backend/tests/test_ingest.py
+"""
+Tests for image ingest: URL fetching against a local HTTP server, upload limits and normalization.
+
+The local server listens on 127.0.0.1, so fetches that should succeed either run with
+allow_private=True (like FETCH_ALLOW_PRIVATE=1) or treat 127.0.0.1 as public.
+"""
+import asyncio
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpcore
+import httpx
+import pytest
+from fastapi import FastAPI, Form
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+
+import ingest
+from ingest import ImageFetcher, ImageIngestError, PublicAddressBackend, RequestSizeLimitMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def jpeg_bytes(width: int, height: int, color=(200, 30, 30)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+SMALL_JPEG = jpeg_bytes(64, 48)
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """
+    Serves the fixed routes the tests fetch from.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status: int, body: bytes = b"", headers: dict | None = None):
+        self.send_response(status)
+        headers = {"Content-Type": "image/jpeg", "Content-Length": str(len(body)), **(headers or {})}
+        for name, value in headers.items():
+            if value is not None:
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/cat.jpg":
+            self.send(200, SMALL_JPEG)
+        elif self.path == "/redirect":
+            self.send(302, headers={"Location": "/cat.jpg"})
+        elif self.path == "/redirect-loop":
+            self.send(302, headers={"Location": "/redirect-loop"})
+        elif self.path == "/redirect-private":
+            self.send(302, headers={"Location": "http://10.0.0.1/cat.jpg"})
+        elif self.path == "/redirect-ftp":
+            self.send(302, headers={"Location": "ftp://example.com/cat.jpg"})
+        elif self.path == "/big-declared":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(10 * 1024 * 1024))
+            self.end_headers()
+        elif self.path == "/big-undeclared":
+            # No Content-Length: the body runs until the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(b"\xff" * 64 * 1024)
+        elif self.path == "/bad-length":
+            self.send(200, SMALL_JPEG, headers={"Content-Length": "abc"})
+        elif self.path == "/slow":
+            time.sleep(1)
+            self.send(200, SMALL_JPEG)
+        elif self.path == "/text":
+            self.send(200, b"hello", headers={"Content-Type": "text/plain"})
+        else:
+            self.send(404, b"")
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    server.requests.clear()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def loopback_is_public(monkeypatch):
+    monkeypatch.setattr(ingest, "_is_public_address", lambda address: address == "127.0.0.1")
+
+
+async def fetch(url: str, **kwargs):
+    fetcher = ImageFetcher(**kwargs)
+    try:
+        return await fetcher.fetch(url)
+    finally:
+        await fetcher.aclose()
+
+
+@pytest.mark.parametrize("address, public", [
+    ("93.184.216.34", True),
+    ("2606:4700:4700::1111", True),
+    ("127.0.0.1", False),
+    ("10.1.2.3", False),
+    ("192.168.0.10", False),
+    ("169.254.169.254", False), # Cloud metadata service
+    ("0.0.0.0", False),
+    ("::1", False),
+    ("fe80::1", False),
+])
+def test_is_public_address(address, public):
+    assert ingest._is_public_address(address) is public
+
+
+async def test_fetch_rejects_private_address(base_url, server):
+    with pytest.raises(ImageIngestError, match="public address") as exc_info:
+        await fetch(f"{base_url}/cat.jpg")
+    assert exc_info.value.status_code == 400
+    assert server.requests == [] # Rejected before connecting
+
+
+@pytest.mark.parametrize("url", ["ftp://example.com/cat.jpg", "file:///etc/passwd", "http:///cat.jpg"])
+async def test_fetch_rejects_unsupported_urls(url):
+    with pytest.raises(ImageIngestError, match="Only http and https"):
+        await fetch(url)
+
+
+async def test_fetch_allow_private(base_url):
+    image = await fetch(f"{base_url}/cat.jpg", allow_private=True)
+    assert image.original_size == len(SMALL_JPEG)
+    assert image.normalized == SMALL_JPEG # Already small enough to pass through
+
+
+async def test_fetch_connects_to_the_checked_address(monkeypatch, server, loopback_is_public):
+    """
+    The hostname is resolved once, by the connection itself, and the connection goes to that
+    address; a second resolution (e.g. a rebinding DNS server) is never consulted.
+    """
+    resolutions = []
+
+    async def getaddrinfo(host, port, **kwargs):
+        resolutions.append(host)
+        address = "127.0.0.1" if len(resolutions) == 1 else "10.0.0.1"
+        return [(2, 1, 6, "", (address, port))]
+
+    monkeypatch.setattr(asyncio.get_running_loop(), "getaddrinfo", getaddrinfo)
+    connected = []
+
+    class RecordingBackend(httpcore.AnyIOBackend):
+        async def connect_tcp(self, host, port, **kwargs):
+            connected.append(host)
+            return await super().connect_tcp(host, port, **kwargs)
+
+    fetcher = ImageFetcher()
+    fetcher.client._transport._pool._network_backend = PublicAddressBackend(RecordingBackend())
+    try:
+        image = await fetcher.fetch(f"http://images.test:{server.server_address[1]}/cat.jpg")
+    finally:
+        await fetcher.aclose()
+    assert image.original_size == len(SMALL_JPEG)
+    assert resolutions == ["images.test"]
+    assert connected == ["127.0.0.1"]
+
+
+async def test_redirects_are_followed(base_url, server):
+    image = await fetch(f"{base_url}/redirect", allow_private=True)
+    assert image.original_size == len(SMALL_JPEG)
+    assert server.requests == ["/redirect", "/cat.jpg"]
+
+
+async def test_redirect_to_private_address_is_rejected(base_url, loopback_is_public):
+    with pytest.raises(ImageIngestError, match="public address"):
+        await fetch(f"{base_url}/redirect-private")
+
+
+async def test_redirect_to_other_scheme_is_rejected(base_url):
+    with pytest.raises(ImageIngestError, match="Only http and https"):
+        await fetch(f"{base_url}/redirect-ftp", allow_private=True)
+
+
+async def test_redirect_loop(base_url):
+    with pytest.raises(ImageIngestError, match="too many times") as exc_info:
+        await fetch(f"{base_url}/redirect-loop", allow_private=True)
+    assert exc_info.value.status_code == 502
+
+
+@pytest.mark.parametrize("path", ["/big-declared", "/big-undeclared"])
+async def test_size_cap(base_url, path):
+    with pytest.raises(ImageIngestError, match="size limit") as exc_info:
+        await fetch(f"{base_url}{path}", allow_private=True, max_bytes=16 * 1024)
+    assert exc_info.value.status_code == 413
+
+
+async def test_malformed_content_length_is_a_client_error(base_url):
+    with pytest.raises(ImageIngestError) as exc_info:
+        await fetch(f"{base_url}/bad-length", allow_private=True)
+    assert exc_info.value.status_code == 502
+
+
+async def test_timeout(base_url, monkeypatch):
+    monkeypatch.setattr(ingest, "FETCH_TIMEOUT", 0.2)
+    with pytest.raises(ImageIngestError, match="Timed out") as exc_info:
+        await fetch(f"{base_url}/slow", allow_private=True)
+    assert exc_info.value.status_code == 504
+
+
+@pytest.mark.parametrize("path, status_code", [("/missing.jpg", 502), ("/text", 400)])
+async def test_bad_responses(base_url, path, status_code):
+    with pytest.raises(ImageIngestError) as exc_info:
+        await fetch(f"{base_url}{path}", allow_private=True)
+    assert exc_info.value.status_code == status_code
+
+
+async def test_fetch_cache(base_url, server):
+    fetcher = ImageFetcher(allow_private=True)
+    try:
+        first = await fetcher.fetch(f"{base_url}/cat.jpg")
+        second = await fetcher.fetch(f"{base_url}/cat.jpg")
+    finally:
+        await fetcher.aclose()
+    assert second is first
+    assert server.requests == ["/cat.jpg"]
+
+
+class FakeUpload:
+    def __init__(self, data: bytes, chunk_size: int = 1024):
+        self.stream = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.stream.read(min(size, self.chunk_size))
+
+
+async def test_read_upload():
+    data, digest = await ingest.read_upload(FakeUpload(SMALL_JPEG))
+    assert data == SMALL_JPEG
+    assert len(digest) == 32
+
+
+async def test_read_upload_limits():
+    with pytest.raises(ImageIngestError) as exc_info:
+        await ingest.read_upload(FakeUpload(b"x" * 5000), max_bytes=4096)
+    assert exc_info.value.status_code == 413
+    with pytest.raises(ImageIngestError, match="empty"):
+        await ingest.read_upload(FakeUpload(b""))
+
+
+def test_normalize_uses_draft_mode(monkeypatch):
+    drafts = []
+    draft = JpegImageFile.draft
+
+    def recording_draft(self, mode, size):
+        drafts.append((mode, size))
+        scale = draft(self, mode, size)
+        drafts.append(self.size) # Size the JPEG decoder will produce
+        return scale
+
+    monkeypatch.setattr(JpegImageFile, "draft", recording_draft)
+    normalized = Image.open(io.BytesIO(ingest.normalize_image(jpeg_bytes(3200, 2400), target_size=384)))
+    assert drafts == [("RGB", (384, 384)), (800, 600)] # Decoded at 1/4 scale
+    assert normalized.format == "JPEG"
+    assert normalized.size == (512, 384)
+
+
+def test_normalize_converts_transparency_to_rgb():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (800, 600), (0, 0, 0, 0)).save(buffer, format="PNG")
+    normalized = Image.open(io.BytesIO(ingest.normalize_image(buffer.getvalue(), target_size=384)))
+    assert normalized.mode == "RGB"
+    assert normalized.size == (512, 384)
+    assert normalized.getpixel((10, 10)) == (255, 255, 255) # Composited on white
+
+
+def test_normalize_applies_exif_orientation():
+    image = Image.new("RGB", (80, 40))
+    exif = image.getexif()
+    exif[0x0112] = 6 # Rotated 90 degrees
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    assert Image.open(io.BytesIO(ingest.normalize_image(buffer.getvalue()))).size == (40, 80)
+
+
+def test_normalize_rejects_oversized_and_invalid_images(monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ImageIngestError) as exc_info:
+        ingest.normalize_image(SMALL_JPEG)
+    assert exc_info.value.status_code == 413
+    with pytest.raises(ImageIngestError, match="decode"):
+        ingest.normalize_image(b"not an image")
+
+
+@pytest.fixture
+def limited_app():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(text: str = Form(...)):
+        return {"length": len(text)}
+
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=1024)
+    return app
+
+
+async def test_request_size_limit(limited_app):
+    async def chunked(size: int):
+        # No Content-Length: the body arrives as a stream of chunks
+        yield b"text="
+        for _ in range(size // 256):
+            yield b"a" * 256
+
+    transport = httpx.ASGITransport(app=limited_app)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        small = await client.post("/echo", content=chunked(512), headers=headers)
+        chunked_large = await client.post("/echo", content=chunked(4096), headers=headers)
+        declared_large = await client.post("/echo", data={"text": "a" * 4096})
+    assert small.status_code == 200
+    assert small.json() == {"length": 512}
+    assert chunked_large.status_code == 413
+    assert declared_large.status_code == 413
@@ -0,0 +1,47 @@
+# backend/tests/test_speech.py
+"""
+Tests for text chunking and audio encoding used by TTS.
+"""
+import io
+
+import numpy as np
+import scipy.io.wavfile as wavfile
+
+from ai_models.speech import encode_audio, split_text, streaming_wav_header, to_pcm16
+
+
+def test_split_text_at_sentences():
+    text = "The first sentence is here. The second one follows it! And is there a third?"
+    assert split_text(text) == ["The first sentence is here.", "The second one follows it!", "And is there a third?"]
+
+
+def test_split_text_merges_short_fragments():
+    assert split_text("Yes. It is a dog sitting on the grass.") == ["Yes. It is a dog sitting on the grass."]
+
+
+def test_split_text_breaks_long_sentences():
+    sentence = ", ".join(["a long clause with several words in it"] * 10) + "."
+    chunks = split_text(sentence, max_chars=100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks) == sentence
+
+
+def test_split_text_breaks_long_words():
+    chunks = split_text("x" * 250, max_chars=100)
+    assert chunks == ["x" * 100, "x" * 100, "x" * 50]
+
+
+def test_split_text_normalizes_whitespace():
+    assert split_text("  Hello   there,\n\tfriend.  ") == ["Hello there, friend."]
+    assert split_text("   ") == []
+
+
+def test_pcm_and_wav_encoding():
+    audio = np.array([0.0, 0.5, -0.5, 2.0, -2.0], dtype=np.float32)
+    pcm = to_pcm16(audio)
+    assert pcm.tolist() == [0, 16383, -16383, 32767, -32767]
+
+    rate, decoded = wavfile.read(io.BytesIO(encode_audio(pcm, 16000, "wav")))
+    assert rate == 16000
+    assert decoded.tolist() == pcm.tolist()
+    assert len(streaming_wav_header(16000)) == 44